@@ -0,0 +1,288 @@
+from array import array
+
+# Размер блока по умолчанию, как у bzip2 -9
+DEFAULT_BLOCK_SIZE = 900 * 1024
+
+# Пиковый расход памяти на байт блока при прямом BWT: удвоенная строка,
+# суффиксный массив и вспомогательные массивы SA-IS (все - array('i')).
+# По tracemalloc на блоках 300 КБ и 900 КБ - от 23 (нули) до 30 байт
+# (случайные данные, худший случай); значение взято с запасом
+BWT_MEMORY_PER_BYTE = 36
+
+# Алфавит SA-IS, начиная с которого корзины хранятся в array, а не в списке
+BUCKET_LIST_LIMIT = 1 << 16
+
+
+def block_size_for_memory(block_size: int, memory_limit: int = None) -> int:
+    """Размер блока, при котором BWT укладывается в memory_limit байт"""
+    if memory_limit is None:
+        return block_size
+    limit = memory_limit // BWT_MEMORY_PER_BYTE
+    if limit < 1:
+        raise ValueError(f"memory_limit={memory_limit} слишком мал для BWT")
+    return min(block_size, limit)
+
+
+def _reset(arr: array, n: int, chunk_size: int = 64 * 1024):
+    """Заполняет arr значением -1 и приводит к длине n
+
+    Заполнение идёт кусками, без временного массива длины n.
+    """
+    del arr[n:]
+    chunk = array('i', [-1]) * min(n, chunk_size)
+    for start in range(0, n, chunk_size):
+        end = min(start + chunk_size, n)
+        arr[start:end] = chunk[:end - start]
+
+
+def _naive_suffix_array(s) -> array:
+    """Сортировка суффиксов сравнением (для очень коротких строк)"""
+    n = len(s)
+    return array('i', sorted(range(n), key=lambda i: s[i:]))
+
+
+def suffix_array(s, upper: int = 255) -> array:
+    """Суффиксный массив методом SA-IS (индуцированная сортировка)
+
+    s - последовательность целых чисел из диапазона [0, upper]
+    (bytes или array). Возвращает array('i') длины len(s).
+    """
+    n = len(s)
+    if n < 10:
+        return _naive_suffix_array(s)
+
+    # Типы суффиксов: 1 - S-тип, 0 - L-тип
+    ls = bytearray(n)
+    for i in range(n - 2, -1, -1):
+        if s[i] == s[i + 1]:
+            ls[i] = ls[i + 1]
+        elif s[i] < s[i + 1]:
+            ls[i] = 1
+
+    # Границы корзин для L- и S-суффиксов. Список быстрее, но в рекурсии
+    # символов бывает почти столько же, сколько позиций, и тогда
+    # компактнее array
+    if upper < BUCKET_LIST_LIMIT:
+        sum_l = [0] * (upper + 2)
+        sum_s = [0] * (upper + 2)
+    else:
+        sum_l = array('i', [0]) * (upper + 2)
+        sum_s = array('i', [0]) * (upper + 2)
+    for i in range(n):
+        if ls[i]:
+            sum_l[s[i] + 1] += 1
+        else:
+            sum_s[s[i]] += 1
+    for c in range(upper + 1):
+        sum_s[c] += sum_l[c]
+        sum_l[c + 1] += sum_s[c]
+
+    sa = array('i')
+
+    def induce(lms):
+        _reset(sa, n)
+        buf = sum_s[:]
+        for d in lms:
+            if d == n:
+                continue
+            c = s[d]
+            sa[buf[c]] = d
+            buf[c] += 1
+
+        buf = sum_l[:]
+        c = s[n - 1]
+        sa[buf[c]] = n - 1
+        buf[c] += 1
+        for v in sa:
+            v -= 1
+            if v >= 0 and not ls[v]:
+                c = s[v]
+                sa[buf[c]] = v
+                buf[c] += 1
+
+        buf = sum_l[:]
+        for v in reversed(sa):
+            v -= 1
+            if v >= 0 and ls[v]:
+                c = s[v] + 1
+                buf[c] -= 1
+                sa[buf[c]] = v
+
+    # LMS-позиции (левый S-суффикс после L-суффикса)
+    lms_map = array('i', [-1]) * (n + 1)
+    lms = array('i')
+    for i in range(1, n):
+        if ls[i] and not ls[i - 1]:
+            lms_map[i] = len(lms)
+            lms.append(i)
+    m = len(lms)
+
+    induce(lms)
+
+    if m:
+        sorted_lms = array('i', (v for v in sa if lms_map[v] != -1))
+        # До второй индукции sa не нужен: на время рекурсии отдаём память
+        del sa[:]
+
+        # Именование LMS-подстрок и рекурсия на сокращённой строке
+        rec_s = array('i', [0]) * m
+        rec_upper = 0
+        rec_s[lms_map[sorted_lms[0]]] = 0
+        for i in range(1, m):
+            left = sorted_lms[i - 1]
+            right = sorted_lms[i]
+            end_l = lms[lms_map[left] + 1] if lms_map[left] + 1 < m else n
+            end_r = lms[lms_map[right] + 1] if lms_map[right] + 1 < m else n
+            same = end_l - left == end_r - right
+            if same:
+                while left < end_l and s[left] == s[right]:
+                    left += 1
+                    right += 1
+                if left == n or right == n or s[left] != s[right]:
+                    same = False
+            if not same:
+                rec_upper += 1
+            rec_s[lms_map[sorted_lms[i]]] = rec_upper
+        del lms_map, sorted_lms
+
+        # Суффиксный массив сокращённой строки сразу переводится
+        # в отсортированные LMS-позиции исходной
+        if rec_upper + 1 == m:
+            # Все LMS-подстроки различны: порядок задан их именами,
+            # рекурсия (и её корзины на rec_upper символов) не нужна
+            rec_sa = array('i', [0]) * m
+            for i in range(m):
+                rec_sa[rec_s[i]] = i
+        else:
+            rec_sa = suffix_array(rec_s, rec_upper)
+        del rec_s
+        for i in range(m):
+            rec_sa[i] = lms[rec_sa[i]]
+        del lms
+        induce(rec_sa)
+
+    return sa
+
+
+def bwt_transform(data: bytes) -> (bytes, int):
+    """Преобразование Барроуза-Уиллера через суффиксный массив
+
+    Результат совпадает с сортировкой всех циклических сдвигов
+    data + b'\\x00': последний столбец и номер строки с исходными данными.
+    """
+    if not data:
+        return b'', 0
+
+    data = bytes(data) + b'\x00'
+    n = len(data)
+
+    # Суффиксы удвоенной строки с началом < n упорядочены так же,
+    # как циклические сдвиги исходной строки
+    sa = suffix_array(data + data)
+
+    bwt_result = bytearray(n)
+    rank_of_zero = 0
+    row = 0
+    for pos in sa:
+        if pos < n:
+            bwt_result[row] = data[pos - 1]
+            if pos == 0:
+                rank_of_zero = row
+            row += 1
+
+    # Для периодической строки равные сдвиги идут подряд;
+    # как и rotations.index(), выбираем первую из таких строк
+    period = _period(data)
+    if period < n:
+        row = 0
+        for pos in sa:
+            if pos < n:
+                if pos % period == 0:
+                    rank_of_zero = row
+                    break
+                row += 1
+
+    return bytes(bwt_result), rank_of_zero
+
+
+def _period(data: bytes) -> int:
+    """Наименьший период p строки, такой что data == data[:p] * (n // p)"""
+    n = len(data)
+    # Строка периодична тогда и только тогда, когда она встречается
+    # в собственном удвоении не только на позициях 0 и n
+    p = (data + data).find(data, 1)
+    return p if p < n else n
+
+
+def inverse_bwt(bwt_data: bytes, index: int) -> bytes:
+    """Обратное преобразование BWT через LF-отображение за O(n)
+
+    bwt_data - последний столбец, index - строка с исходными данными.
+    Возвращает данные без маркера конца.
+    """
+    n = len(bwt_data)
+    if not n:
+        return b''
+    if not 0 <= index < n:
+        raise ValueError(f"Повреждённые данные: номер строки BWT {index} вне блока длины {n}")
+
+    # Начало корзины каждого символа в первом (отсортированном) столбце
+    counts = [0] * 256
+    for c in bwt_data:
+        counts[c] += 1
+    starts = [0] * 256
+    total = 0
+    for c in range(256):
+        starts[c] = total
+        total += counts[c]
+
+    # lf[i] - строка, в которой находится сдвиг строки i на символ вправо
+    lf = array('I', [0]) * n
+    for i, c in enumerate(bwt_data):
+        lf[i] = starts[c]
+        starts[c] += 1
+
+    original = bytearray(n)
+    row = index
+    for k in range(n - 1, -1, -1):
+        original[k] = bwt_data[row]
+        row = lf[row]
+
+    return bytes(original[:-1])  # Удаляем маркер конца
+
+
+def benchmark_inverse_bwt(data: bytes, block_sizes=(100 * 1024, 300 * 1024, 900 * 1024)) -> dict:
+    """Замер скорости обратного BWT на блоках разного размера (МБ/с)"""
+    import time
+
+    results = {}
+    for block_size in block_sizes:
+        block = data[:block_size]
+        bwt_data, index = bwt_transform(block)
+
+        start = time.perf_counter()
+        restored = inverse_bwt(bwt_data, index)
+        elapsed = time.perf_counter() - start
+
+        assert restored == block
+        results[block_size] = len(block) / elapsed / (1024 * 1024) if elapsed > 0 else 0.0
+    return results
+
+
+# Пример использования
+if __name__ == "__main__":
+    import random
+    import sys
+
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], 'rb') as f:
+            test_data = f.read(900 * 1024)
+    else:
+        words = [b'the', b'of', b'and', b'compression', b'block', b'wheeler', b'burrows', b'[[link]]', b'\n']
+        rng = random.Random(0)
+        test_data = b' '.join(rng.choice(words) for _ in range(200 * 1024))[:900 * 1024]
+
+    print("{:<12} {:<12}".format('Block Size', 'Decode MB/s'))
+    print("-" * 24)
+    for size, speed in benchmark_inverse_bwt(test_data).items():
+        print("{:<12} {:<12.2f}".format(size, speed))
@@ -1,187 +1,145 @@
 import os
-from heapq import heappush, heappop, heapify
 from collections import defaultdict, Counter
 
+from BWT import DEFAULT_BLOCK_SIZE, block_size_for_memory, bwt_transform, inverse_bwt
+from HA import BitWriter, HuffmanDecoder, canonical_codes, huffman_code_lengths, pack_code_lengths, unpack_code_lengths
+from MTF import DEFAULT_MTF_ENGINE, get_mtf_engine
+from container import ContainerMixin, read_block_index, read_indexed_blocks, write_block_index
+from parallel import map_blocks
 
-class BWT_MTF_HA_Compressor:
-    def __init__(self, block_size=1024):
-        self.block_size = block_size
+
+class BWT_MTF_HA_Compressor(ContainerMixin):
+    codec_name = 'bwt-mtf-huffman'
+
+    def __init__(self, block_size=DEFAULT_BLOCK_SIZE, memory_limit=None, workers=1, block_index=False,
+                 mtf_engine=DEFAULT_MTF_ENGINE):
+        self.memory_limit = memory_limit
+        self.block_size = block_size_for_memory(block_size, memory_limit)
+        self.workers = workers
+        self.block_index = block_index
+        self.mtf_engine = mtf_engine
+        get_mtf_engine(mtf_engine)  # fail early on an unknown engine name
 
     # BWT Implementation
     def bwt_encode(self, data: bytes) -> (bytes, int):
-        data += b'\x00'
-        n = len(data)
-        rotations = sorted(data[i:] + data[:i] for i in range(n))
-        bwt_result = bytes(rot[-1] for rot in rotations)
-        return bwt_result, rotations.index(data)
+        return bwt_transform(data)
 
     # MTF Implementation
     def mtf_encode(self, data: bytes) -> bytes:
-        dictionary = list(range(256))
-        encoded = []
-        for byte in data:
-            idx = dictionary.index(byte)
-            encoded.append(idx)
-            dictionary.pop(idx)
-            dictionary.insert(0, byte)
-        return bytes(encoded)
+        return get_mtf_engine(self.mtf_engine)[0](data)
 
     # Huffman Implementation
-    class HuffmanNode:
-        def __init__(self, char=None, freq=0):
-            self.char = char
-            self.freq = freq
-            self.left = None
-            self.right = None
-
-        def __lt__(self, other):
-            return self.freq < other.freq
-
-    def build_huffman_tree(self, freq_table):
-        heap = []
-        for char, freq in freq_table.items():
-            heappush(heap, self.HuffmanNode(char, freq))
-
-        while len(heap) > 1:
-            left = heappop(heap)
-            right = heappop(heap)
-            merged = self.HuffmanNode(freq=left.freq + right.freq)
-            merged.left = left
-            merged.right = right
-            heappush(heap, merged)
-
-        return heappop(heap) if heap else None
-
     def huffman_encode(self, data: bytes) -> (bytes, dict, int):
         freq_table = Counter(data)
-        root = self.build_huffman_tree(freq_table)
-        codes = self.build_codes(root)
+        lengths = huffman_code_lengths(freq_table)
 
-        encoded_bits = ''.join(codes[byte] for byte in data)
-        padding = 8 - (len(encoded_bits) % 8)
-        encoded_bits += '0' * padding
+        # The output size is known up front from the frequencies
+        bit_count = sum(freq * lengths[char] for char, freq in freq_table.items())
+        writer = BitWriter((bit_count + 7) // 8)
+        writer.write_symbols(canonical_codes(lengths), data)
+        padding = -bit_count % 8
+        return writer.getvalue(), lengths, padding
 
-        encoded_bytes = bytes(
-            int(encoded_bits[i:i + 8], 2)
-            for i in range(0, len(encoded_bits), 8)
-        )
-        return encoded_bytes, freq_table, padding
+    # Full Compression Pipeline
+    def compress_block(self, block: bytes) -> bytes:
+        # BWT
+        bwt_data, index = self.bwt_encode(block)
 
-    def build_codes(self, root):
-        codes = {}
+        # MTF
+        mtf_data = self.mtf_encode(bwt_data)
 
-        def traverse(node, code):
-            if node:
-                if node.char is not None:
-                    codes[node.char] = code
-                    return
-                traverse(node.left, code + '0')
-                traverse(node.right, code + '1')
+        # Huffman
+        encoded, lengths, padding = self.huffman_encode(mtf_data)
 
-        traverse(root, '')
-        return codes
+        # Metadata
+        record = bytearray()
+        record += index.to_bytes(4, 'big')
+        record += padding.to_bytes(1, 'big')
+        table = pack_code_lengths(lengths)
+        record += len(table).to_bytes(2, 'big')
+        record += table
+
+        # Compressed data
+        record += len(encoded).to_bytes(4, 'big')
+        record += encoded
+        return bytes(record)
 
-    # Full Compression Pipeline
     def compress_file(self, input_path: str, output_path: str):
         original_size = os.path.getsize(input_path)
 
         with open(input_path, 'rb') as fin, open(output_path, 'wb') as fout:
-            while True:
-                block = fin.read(self.block_size)
-                if not block:
-                    break
+            # With workers > 1 blocks are compressed in a process pool
+            entries = self.write_records(fin, fout)
 
-                # BWT
-                bwt_data, index = self.bwt_encode(block)
-
-                # MTF
-                mtf_data = self.mtf_encode(bwt_data)
-
-                # Huffman
-                encoded, freq_table, padding = self.huffman_encode(mtf_data)
-
-                # Write metadata
-                fout.write(index.to_bytes(4, 'big'))
-                fout.write(padding.to_bytes(1, 'big'))
-                fout.write(len(freq_table).to_bytes(2, 'big'))
-                for char, freq in freq_table.items():
-                    fout.write(bytes([char]))
-                    fout.write(freq.to_bytes(4, 'big'))
-
-                # Write compressed data
-                fout.write(len(encoded).to_bytes(4, 'big'))
-                fout.write(encoded)
+            # Optional block index for parallel decompression
+            if self.block_index:
+                write_block_index(fout, entries)
 
         compressed_size = os.path.getsize(output_path)
         return original_size, compressed_size
 
     # Decompression
+    def read_record(self, fin) -> bytes:
+        """Reads one block record, returns b'' at end of file"""
+        header = fin.read(7)
+        if not header:
+            return b''
+        table_size = int.from_bytes(header[5:7], 'big')
+        table = fin.read(table_size)
+        data_len_bytes = fin.read(4)
+        data_len = int.from_bytes(data_len_bytes, 'big')
+        return header + table + data_len_bytes + fin.read(data_len)
+
+    def decompress_block(self, record: bytes) -> bytes:
+        # Read metadata
+        if len(record) < 7:
+            raise ValueError("Повреждённые данные: обрезанный заголовок блока")
+        index = int.from_bytes(record[0:4], 'big')
+        padding = record[4]
+        lengths, pos = unpack_code_lengths(record, 7)
+
+        data_len = int.from_bytes(record[pos:pos + 4], 'big')
+        encoded_data = record[pos + 4:pos + 4 + data_len]
+        if pos + 4 > len(record) or len(encoded_data) != data_len:
+            raise ValueError("Повреждённые данные: блок короче указанного размера")
+
+        # Huffman decode
+        mtf_data = self.huffman_decode(encoded_data, lengths, padding)
+
+        # MTF decode
+        bwt_data = self.mtf_decode(mtf_data)
+
+        # Inverse BWT
+        return self.inverse_bwt(bwt_data, index)
+
     def decompress_file(self, input_path: str, output_path: str):
         with open(input_path, 'rb') as fin, open(output_path, 'wb') as fout:
-            while True:
-                try:
-                    # Read metadata
-                    index = int.from_bytes(fin.read(4), 'big')
-                    padding = int.from_bytes(fin.read(1), 'big')
-                    freq_table_size = int.from_bytes(fin.read(2), 'big')
-
-                    freq_table = {}
-                    for _ in range(freq_table_size):
-                        char = ord(fin.read(1))
-                        freq = int.from_bytes(fin.read(4), 'big')
-                        freq_table[char] = freq
-
-                    data_len = int.from_bytes(fin.read(4), 'big')
-                    encoded_data = fin.read(data_len)
-
-                    # Huffman decode
-                    mtf_data = self.huffman_decode(encoded_data, freq_table, padding)
-
-                    # MTF decode
-                    bwt_data = self.mtf_decode(mtf_data)
-
-                    # Inverse BWT
-                    original_block = self.inverse_bwt(bwt_data, index)
-                    fout.write(original_block)
-                except EOFError:
-                    break
-
-    def huffman_decode(self, data, freq_table, padding):
-        root = self.build_huffman_tree(freq_table)
-        bit_str = ''.join(f"{byte:08b}" for byte in data)
-        bit_str = bit_str[:-padding] if padding > 0 else bit_str
-
-        decoded = []
-        node = root
-        for bit in bit_str:
-            node = node.left if bit == '0' else node.right
-            if node.char is not None:
-                decoded.append(node.char)
-                node = root
-        return bytes(decoded)
+            # Blocks are located through the trailing index when present,
+            # otherwise by scanning the record headers
+            entries = read_block_index(fin)
+            if entries is not None:
+                records = read_indexed_blocks(fin, entries)
+            else:
+                records = iter(lambda: self.read_record(fin), b'')
+
+            for block in map_blocks(self.decompress_block, records, self.workers):
+                fout.write(block)
+
+    def huffman_decode(self, data, lengths, padding):
+        # Table-driven decoding straight from the canonical code lengths
+        decoder = HuffmanDecoder.from_lengths(lengths)
+        return bytes(decoder.decode(data, len(data) * 8 - padding))
 
     def mtf_decode(self, data):
-        dictionary = list(range(256))
-        decoded = []
-        for idx in data:
-            char = dictionary[idx]
-            decoded.append(char)
-            dictionary.pop(idx)
-            dictionary.insert(0, char)
-        return bytes(decoded)
+        return get_mtf_engine(self.mtf_engine)[1](data)
 
     def inverse_bwt(self, bwt_data, index):
-        table = [bytearray() for _ in range(len(bwt_data))]
-        for _ in range(len(bwt_data)):
-            for i, c in enumerate(bwt_data):
-                table[i].insert(0, c)
-            table.sort()
-        return bytes(table[index][:-1])
+        return inverse_bwt(bwt_data, index)
 
 
 # Пример использования
 if __name__ == "__main__":
-    compressor = BWT_MTF_HA_Compressor(block_size=1024)
+    compressor = BWT_MTF_HA_Compressor(block_size=900 * 1024)
 
     # Сжатие
     input_file = "D:\Pycharm projects\Help Natasha\enwik7.txt"
@@ -1,226 +1,187 @@
 import os
-from heapq import heappush, heappop, heapify
+import time
 from collections import defaultdict, Counter
 
+from BWT import DEFAULT_BLOCK_SIZE, block_size_for_memory, bwt_transform, inverse_bwt
+from HA import BitWriter, HuffmanDecoder, canonical_codes, huffman_code_lengths, pack_code_lengths, unpack_code_lengths
+from MTF import DEFAULT_MTF_ENGINE, get_mtf_engine
+from RLE import rle_decode_bytes, rle_encode_bytes
+from container import ContainerMixin, read_block_index, read_indexed_blocks, write_block_index
+from pipeline_stats import measure
 
-class BWT_MTF_RLE_HA_Compressor:
-    def __init__(self, block_size=1024):
-        self.block_size = block_size
+
+class BWT_MTF_RLE_HA_Compressor(ContainerMixin):
+    codec_name = 'bwt-mtf-rle-huffman'
+    stage_stats = True
+
+    def __init__(self, block_size=DEFAULT_BLOCK_SIZE, memory_limit=None, workers=1, block_index=False,
+                 mtf_engine=DEFAULT_MTF_ENGINE):
+        self.memory_limit = memory_limit
+        self.block_size = block_size_for_memory(block_size, memory_limit)
+        self.workers = workers
+        self.block_index = block_index
+        self.mtf_engine = mtf_engine
+        get_mtf_engine(mtf_engine)  # fail early on an unknown engine name
 
     # BWT Implementation
     def bwt_transform(self, data: bytes) -> tuple[bytes, int]:
-        if not data:
-            return b'', 0
-        data += b'\x00'
-        n = len(data)
-        rotations = sorted(data[i:] + data[:i] for i in range(n))
-        bwt_result = bytes(rot[-1] for rot in rotations)
-        return bwt_result, rotations.index(data)
+        return bwt_transform(data)
 
     # MTF Implementation
     def mtf_encode(self, data: bytes) -> bytes:
-        dictionary = list(range(256))
-        encoded = []
-        for byte in data:
-            idx = dictionary.index(byte)
-            encoded.append(idx)
-            dictionary.pop(idx)
-            dictionary.insert(0, byte)
-        return bytes(encoded)
+        return get_mtf_engine(self.mtf_engine)[0](data)
 
     # RLE Implementation
     def rle_encode(self, data: bytes) -> bytes:
-        encoded = bytearray()
-        i = 0
-        n = len(data)
-        while i < n:
-            count = 1
-            while i + 1 < n and data[i] == data[i + 1] and count < 255:
-                count += 1
-                i += 1
-            if count > 1:
-                encoded.extend([data[i], count])
-            else:
-                encoded.append(data[i])
-            i += 1
-        return bytes(encoded)
+        # A repeated byte marks a run, followed by the remaining count
+        return rle_encode_bytes(data)
 
     # Huffman Implementation
-    class HuffmanNode:
-        def __init__(self, char=None, freq=0):
-            self.char = char
-            self.freq = freq
-            self.left = None
-            self.right = None
-
-        def __lt__(self, other):
-            return self.freq < other.freq
-
-    def build_huffman_tree(self, freq_table):
-        heap = []
-        for char, freq in freq_table.items():
-            heappush(heap, self.HuffmanNode(char, freq))
-
-        while len(heap) > 1:
-            left = heappop(heap)
-            right = heappop(heap)
-            merged = self.HuffmanNode(freq=left.freq + right.freq)
-            merged.left = left
-            merged.right = right
-            heappush(heap, merged)
-
-        return heappop(heap) if heap else None
-
     def huffman_encode(self, data: bytes) -> tuple[bytes, dict, int]:
         freq_table = Counter(data)
-        root = self.build_huffman_tree(freq_table)
-        codes = self.build_codes(root)
-
-        encoded_bits = ''.join(codes[byte] for byte in data)
-        padding = 8 - (len(encoded_bits) % 8)
-        encoded_bits += '0' * padding
+        lengths = huffman_code_lengths(freq_table)
 
-        encoded_bytes = bytes(
-            int(encoded_bits[i:i + 8], 2)
-            for i in range(0, len(encoded_bits), 8)
-        )
-        return encoded_bytes, freq_table, padding
-
-    def build_codes(self, root):
-        codes = {}
-
-        def traverse(node, code):
-            if node:
-                if node.char is not None:
-                    codes[node.char] = code
-                    return
-                traverse(node.left, code + '0')
-                traverse(node.right, code + '1')
-
-        traverse(root, '')
-        return codes
+        # The output size is known up front from the frequencies
+        bit_count = sum(freq * lengths[char] for char, freq in freq_table.items())
+        writer = BitWriter((bit_count + 7) // 8)
+        writer.write_symbols(canonical_codes(lengths), data)
+        padding = -bit_count % 8
+        return writer.getvalue(), lengths, padding
 
     # Compression Pipeline
-    def compress_file(self, input_path: str, output_path: str):
+    def compress_block(self, block: bytes, stats=None) -> bytes:
+        # BWT
+        with measure(stats, 'bwt', len(block)) as stage:
+            bwt_data, index = self.bwt_transform(block)
+            stage.bytes_out = len(bwt_data)
+
+        # MTF
+        with measure(stats, 'mtf', len(bwt_data)) as stage:
+            mtf_data = self.mtf_encode(bwt_data)
+            stage.bytes_out = len(mtf_data)
+
+        # RLE
+        with measure(stats, 'rle', len(mtf_data)) as stage:
+            rle_data = self.rle_encode(mtf_data)
+            stage.bytes_out = len(rle_data)
+
+        # Huffman
+        with measure(stats, 'huffman', len(rle_data)) as stage:
+            encoded, lengths, padding = self.huffman_encode(rle_data)
+            stage.bytes_out = len(encoded)
+
+        # Metadata
+        record = bytearray()
+        record += index.to_bytes(4, 'big')
+        record += padding.to_bytes(1, 'big')
+        table = pack_code_lengths(lengths)
+        record += len(table).to_bytes(2, 'big')
+        record += table
+
+        # Compressed data
+        record += len(encoded).to_bytes(4, 'big')
+        record += encoded
+        return bytes(record)
+
+    def compress_file(self, input_path: str, output_path: str, stats=None):
+        """Returns (original size, compressed size); per-stage timings go to stats if given"""
+        start = time.perf_counter()
         original_size = os.path.getsize(input_path)
 
         with open(input_path, 'rb') as fin, open(output_path, 'wb') as fout:
-            while True:
-                block = fin.read(self.block_size)
-                if not block:
-                    break
-
-                # BWT
-                bwt_data, index = self.bwt_transform(block)
+            # With workers > 1 blocks are compressed in a process pool
+            entries = self.write_records(fin, fout, stats)
 
-                # MTF
-                mtf_data = self.mtf_encode(bwt_data)
-
-                # RLE
-                rle_data = self.rle_encode(mtf_data)
-
-                # Huffman
-                encoded, freq_table, padding = self.huffman_encode(rle_data)
-
-                # Write metadata
-                fout.write(index.to_bytes(4, 'big'))
-                fout.write(padding.to_bytes(1, 'big'))
-                fout.write(len(freq_table).to_bytes(2, 'big'))
-                for char, freq in freq_table.items():
-                    fout.write(bytes([char]))
-                    fout.write(freq.to_bytes(4, 'big'))
-
-                # Write compressed data
-                fout.write(len(encoded).to_bytes(4, 'big'))
-                fout.write(encoded)
+            # Optional block index for parallel decompression
+            if self.block_index:
+                write_block_index(fout, entries)
 
         compressed_size = os.path.getsize(output_path)
+        if stats is not None:
+            stats.elapsed += time.perf_counter() - start
         return original_size, compressed_size
 
     # Decompression Pipeline
-    def decompress_file(self, input_path: str, output_path: str):
+    def read_record(self, fin) -> bytes:
+        """Reads one block record, returns b'' at end of file"""
+        header = fin.read(7)
+        if not header:
+            return b''
+        table_size = int.from_bytes(header[5:7], 'big')
+        table = fin.read(table_size)
+        data_len_bytes = fin.read(4)
+        data_len = int.from_bytes(data_len_bytes, 'big')
+        return header + table + data_len_bytes + fin.read(data_len)
+
+    def decompress_block(self, record: bytes, stats=None) -> bytes:
+        # Read metadata
+        if len(record) < 7:
+            raise ValueError("Повреждённые данные: обрезанный заголовок блока")
+        index = int.from_bytes(record[0:4], 'big')
+        padding = record[4]
+        lengths, pos = unpack_code_lengths(record, 7)
+
+        data_len = int.from_bytes(record[pos:pos + 4], 'big')
+        encoded_data = record[pos + 4:pos + 4 + data_len]
+        if pos + 4 > len(record) or len(encoded_data) != data_len:
+            raise ValueError("Повреждённые данные: блок короче указанного размера")
+
+        # Huffman decode
+        with measure(stats, 'huffman', len(encoded_data)) as stage:
+            rle_data = self.huffman_decode(encoded_data, lengths, padding)
+            stage.bytes_out = len(rle_data)
+
+        # RLE decode
+        with measure(stats, 'rle', len(rle_data)) as stage:
+            mtf_data = self.rle_decode(rle_data)
+            stage.bytes_out = len(mtf_data)
+
+        # MTF decode
+        with measure(stats, 'mtf', len(mtf_data)) as stage:
+            bwt_data = self.mtf_decode(mtf_data)
+            stage.bytes_out = len(bwt_data)
+
+        # Inverse BWT
+        with measure(stats, 'bwt', len(bwt_data)) as stage:
+            block = self.inverse_bwt(bwt_data, index)
+            stage.bytes_out = len(block)
+        return block
+
+    def decompress_file(self, input_path: str, output_path: str, stats=None):
+        start = time.perf_counter()
         with open(input_path, 'rb') as fin, open(output_path, 'wb') as fout:
-            while True:
-                try:
-                    # Read metadata
-                    index = int.from_bytes(fin.read(4), 'big')
-                    padding = int.from_bytes(fin.read(1), 'big')
-                    freq_table_size = int.from_bytes(fin.read(2), 'big')
-
-                    freq_table = {}
-                    for _ in range(freq_table_size):
-                        char = ord(fin.read(1))
-                        freq = int.from_bytes(fin.read(4), 'big')
-                        freq_table[char] = freq
-
-                    data_len = int.from_bytes(fin.read(4), 'big')
-                    encoded_data = fin.read(data_len)
-
-                    # Huffman decode
-                    rle_data = self.huffman_decode(encoded_data, freq_table, padding)
-
-                    # RLE decode
-                    mtf_data = self.rle_decode(rle_data)
-
-                    # MTF decode
-                    bwt_data = self.mtf_decode(mtf_data)
-
-                    # Inverse BWT
-                    original_block = self.inverse_bwt(bwt_data, index)
-                    fout.write(original_block)
-                except EOFError:
-                    break
-
-    def huffman_decode(self, data, freq_table, padding):
-        root = self.build_huffman_tree(freq_table)
-        bit_str = ''.join(f"{byte:08b}" for byte in data)
-        bit_str = bit_str[:-padding] if padding > 0 else bit_str
-
-        decoded = []
-        node = root
-        for bit in bit_str:
-            node = node.left if bit == '0' else node.right
-            if node.char is not None:
-                decoded.append(node.char)
-                node = root
-        return bytes(decoded)
+            # Blocks are located through the trailing index when present,
+            # otherwise by scanning the record headers
+            entries = read_block_index(fin)
+            if entries is not None:
+                records = read_indexed_blocks(fin, entries)
+            else:
+                records = iter(lambda: self.read_record(fin), b'')
+
+            for block in self._map_with_stats(self._decompress_measured, records, stats):
+                fout.write(block)
+
+        if stats is not None:
+            stats.elapsed += time.perf_counter() - start
+
+    def huffman_decode(self, data, lengths, padding):
+        # Table-driven decoding straight from the canonical code lengths
+        decoder = HuffmanDecoder.from_lengths(lengths)
+        return bytes(decoder.decode(data, len(data) * 8 - padding))
 
     def rle_decode(self, data: bytes) -> bytes:
-        decoded = bytearray()
-        i = 0
-        n = len(data)
-        while i < n:
-            if i + 1 < n and data[i] == data[i + 1]:
-                count = data[i + 1]
-                decoded.extend([data[i]] * count)
-                i += 2
-            else:
-                decoded.append(data[i])
-                i += 1
-        return bytes(decoded)
+        return rle_decode_bytes(data)
 
     def mtf_decode(self, data: bytes) -> bytes:
-        dictionary = list(range(256))
-        decoded = []
-        for idx in data:
-            char = dictionary[idx]
-            decoded.append(char)
-            dictionary.pop(idx)
-            dictionary.insert(0, char)
-        return bytes(decoded)
+        return get_mtf_engine(self.mtf_engine)[1](data)
 
     def inverse_bwt(self, bwt_data: bytes, index: int) -> bytes:
-        table = [bytearray() for _ in range(len(bwt_data))]
-        for _ in range(len(bwt_data)):
-            for i, c in enumerate(bwt_data):
-                table[i].insert(0, c)
-            table.sort()
-        return bytes(table[index][:-1])
+        return inverse_bwt(bwt_data, index)
 
 
 # Пример использования
 if __name__ == "__main__":
-    compressor = BWT_MTF_RLE_HA_Compressor(block_size=1024)
+    compressor = BWT_MTF_RLE_HA_Compressor(block_size=900 * 1024)
 
     # Сжатие
     input_file = "D:\Pycharm projects\Help Natasha\enwik7.txt"
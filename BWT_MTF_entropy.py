@@ -1,84 +1,64 @@
 import math
-import matplotlib.pyplot as plt
 
+from BWT import bwt_transform as bwt_encode
+from MTF import DEFAULT_MTF_ENGINE, mtf_encode
+from entropy import BlockMemo, shannon_entropy
 
-def calculate_entropy(data: bytes) -> float:
-    """Вычисление энтропии Шеннона для байтовой строки"""
-    if not data:
-        return 0.0
-
-    freq = {}
-    for byte in data:
-        freq[byte] = freq.get(byte, 0) + 1
+# Размеры блоков для анализа: от мелких до блоков класса bzip2
+BLOCK_SIZES = [64, 128, 256, 512, 1024, 2048, 4096,
+               16 * 1024, 64 * 1024, 100 * 1024, 300 * 1024, 900 * 1024]
 
-    entropy = 0.0
-    total = len(data)
-    for count in freq.values():
-        p = count / total
-        entropy -= p * math.log2(p)
 
-    return entropy
+def calculate_entropy(data: bytes) -> float:
+    """Вычисление энтропии Шеннона для байтовой строки"""
+    return shannon_entropy(data)
 
 
 def bwt_transform(block: bytes) -> bytes:
     """BWT преобразование для блока данных"""
-    if not block:
-        return b''
-
-    # Добавляем маркер конца данных
-    block += b'\x00'
-    rotations = [block[i:] + block[:i] for i in range(len(block))]
-    rotations.sort()
-    bwt_result = bytes([rot[-1] for rot in rotations])
+    bwt_result, _ = bwt_encode(block)
     return bwt_result
 
 
-def mtf_transform(data: bytes) -> bytes:
+def mtf_transform(data: bytes, engine: str = DEFAULT_MTF_ENGINE) -> bytes:
     """MTF преобразование"""
-    dictionary = list(range(256))
-    result = []
+    return mtf_encode(data, engine)
 
-    for byte in data:
-        idx = dictionary.index(byte)
-        result.append(idx)
-        # Перемещаем символ в начало
-        del dictionary[idx]
-        dictionary.insert(0, byte)
 
-    return bytes(result)
+def bwt_mtf_entropy(block: bytes) -> float:
+    """Энтропия блока после BWT+MTF"""
+    return calculate_entropy(mtf_transform(bwt_transform(block)))
 
 
-def analyze_entropy(data: bytes, max_block_size: int = 4096) -> dict:
-    """Анализ энтропии для разных размеров блоков"""
-    results = {}
+# Результаты BWT+MTF по содержимому блока: повторный анализ тех же данных
+# (analyze_entropy() после analyze_compression()) берёт их из памяти
+transform_memo = BlockMemo(bwt_mtf_entropy)
 
-    for block_size in [64, 128, 256, 512, 1024, 2048, 4096]:
-        if block_size > max_block_size:
-            continue
 
-        total_entropy = 0.0
-        blocks = 0
+def block_entropies(data: bytes, block_size: int, workers: int = 1) -> list:
+    """(размер, энтропия после BWT+MTF) для каждого блока data"""
+    blocks = [data[i:i + block_size] for i in range(0, len(data), block_size)]
+    return list(zip(map(len, blocks), transform_memo.map(blocks, workers)))
 
-        for i in range(0, len(data), block_size):
-            block = data[i:i + block_size]
 
-            # Применяем BWT+MTF
-            bwt_block = bwt_transform(block)
-            mtf_block = mtf_transform(bwt_block)
+def analyze_entropy(data: bytes, max_block_size: int = 900 * 1024, workers: int = 1) -> dict:
+    """Анализ энтропии для разных размеров блоков"""
+    results = {}
 
-            # Считаем энтропию
-            entropy = calculate_entropy(mtf_block)
-            total_entropy += entropy
-            blocks += 1
+    for block_size in BLOCK_SIZES:
+        if block_size > max_block_size:
+            continue
 
-        avg_entropy = total_entropy / blocks if blocks > 0 else 0
-        results[block_size] = avg_entropy
+        entropies = [entropy for _, entropy in block_entropies(data, block_size, workers)]
+        results[block_size] = sum(entropies) / len(entropies) if entropies else 0
 
     return results
 
 
 def plot_results(results: dict):
     """Визуализация результатов"""
+    import matplotlib.pyplot as plt
+
     sizes = sorted(results.keys())
     entropies = [results[size] for size in sizes]
 
@@ -92,11 +72,15 @@ def plot_results(results: dict):
     plt.show()
 
 
-def analyze_compression(data: bytes, max_block_size: int = 4096) -> dict:
-    """Анализ энтропии и коэффициента сжатия для разных размеров блоков"""
+def analyze_compression(data: bytes, max_block_size: int = 900 * 1024, workers: int = 1) -> dict:
+    """Анализ энтропии и коэффициента сжатия для разных размеров блоков
+
+    Сжатый размер - оценка снизу для энтропийного кодера после BWT+MTF:
+    энтропия блока, умноженная на его длину.
+    """
     results = {}
 
-    for block_size in [64, 128, 256, 512, 1024, 2048, 4096]:
+    for block_size in BLOCK_SIZES:
         if block_size > max_block_size:
             continue
 
@@ -105,20 +89,10 @@ def analyze_compression(data: bytes, max_block_size: int = 4096) -> dict:
         total_original = 0
         blocks = 0
 
-        for i in range(0, len(data), block_size):
-            block = data[i:i + block_size]
-            if not block:
-                continue
-
-            # Применяем цепочку преобразований
-            bwt_block = bwt_transform(block)
-            mtf_block = mtf_transform(bwt_block)
-
-            # Считаем метрики
-            entropy = calculate_entropy(mtf_block)
+        for size, entropy in block_entropies(data, block_size, workers):
             total_entropy += entropy
-            total_compressed += len(mtf_block)
-            total_original += len(block)
+            total_compressed += max(1, math.ceil(entropy * size / 8))
+            total_original += size
             blocks += 1
 
         avg_entropy = total_entropy / blocks if blocks > 0 else 0
@@ -159,6 +133,8 @@ def print_results_table(results: dict):
 
 def plot_combined_results(results: dict):
     """Визуализация энтропии и коэффициента сжатия"""
+    import matplotlib.pyplot as plt
+
     sizes = sorted(results.keys())
     entropies = [results[size]['entropy'] for size in sizes]
     ratios = [results[size]['compression_ratio'] for size in sizes]
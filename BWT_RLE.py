@@ -1,125 +1,102 @@
 import os
 
+from BWT import DEFAULT_BLOCK_SIZE, block_size_for_memory, bwt_transform, inverse_bwt
+from RLE import rle_decode_bytes, rle_encode_bytes
+from container import ContainerMixin, read_block_index, read_indexed_blocks, write_block_index
+from parallel import map_blocks
 
-class BWT_RLE_Compressor:
-    def __init__(self, block_size=1024):
-        self.block_size = block_size
+
+class BWT_RLE_Compressor(ContainerMixin):
+    codec_name = 'bwt-rle'
+
+    def __init__(self, block_size=DEFAULT_BLOCK_SIZE, memory_limit=None, workers=1, block_index=False):
+        self.memory_limit = memory_limit
+        self.block_size = block_size_for_memory(block_size, memory_limit)
+        self.workers = workers
+        self.block_index = block_index
 
     def bwt_transform(self, data: bytes) -> (bytes, int):
         """Преобразование Барроуза-Уиллера"""
-        if not data:
-            return b'', 0
-
-        data += b'\x00'
-        n = len(data)
-        rotations = [data[i:] + data[:i] for i in range(n)]
-        rotations.sort()
+        return bwt_transform(data)
 
-        bwt_result = bytes(rot[-1] for rot in rotations)
-        original_index = rotations.index(data)
+    def rle_encode(self, data: bytes) -> bytes:
+        """Кодирование длин серий (RLE)
 
-        return bwt_result, original_index
+        Серия записывается как два одинаковых байта и число
+        оставшихся повторов (0..255), одиночный байт - как есть.
+        """
+        return rle_encode_bytes(data)
 
-    def rle_encode(self, data: bytes) -> bytes:
-        """Кодирование длин серий (RLE)"""
-        encoded = bytearray()
-        i = 0
-        n = len(data)
-
-        while i < n:
-            count = 1
-            while i + 1 < n and data[i] == data[i + 1] and count < 255:
-                count += 1
-                i += 1
-
-            if count > 1:
-                encoded.extend([data[i], count])
-            else:
-                encoded.append(data[i])
+    def compress_block(self, block: bytes) -> bytes:
+        """Сжатие одного блока вместе с его метаданными"""
+        # Применяем BWT
+        bwt_data, index = self.bwt_transform(block)
 
-            i += 1
+        # Применяем RLE
+        rle_data = self.rle_encode(bwt_data)
 
-        return bytes(encoded)
+        # Метаданные и данные
+        return index.to_bytes(4, 'big') + len(rle_data).to_bytes(4, 'big') + rle_data
 
     def compress_file(self, input_path: str, output_path: str):
-        """Сжатие файла"""
+        """Сжатие файла (при workers > 1 блоки сжимаются параллельно)"""
         original_size = os.path.getsize(input_path)
 
         with open(input_path, 'rb') as fin, open(output_path, 'wb') as fout:
-            while True:
-                block = fin.read(self.block_size)
-                if not block:
-                    break
+            entries = self.write_records(fin, fout)
 
-                # Применяем BWT
-                bwt_data, index = self.bwt_transform(block)
-
-                # Применяем RLE
-                rle_data = self.rle_encode(bwt_data)
-
-                # Запись метаданных и данных
-                fout.write(index.to_bytes(4, 'big'))
-                fout.write(len(rle_data).to_bytes(4, 'big'))
-                fout.write(rle_data)
+            # Индекс блоков для параллельной распаковки
+            if self.block_index:
+                write_block_index(fout, entries)
 
         compressed_size = os.path.getsize(output_path)
         return original_size, compressed_size
 
-    def decompress_file(self, input_path: str, output_path: str):
-        """Распаковка файла"""
-        with open(input_path, 'rb') as fin, open(output_path, 'wb') as fout:
-            while True:
-                index_bytes = fin.read(4)
-                if not index_bytes:
-                    break
+    def read_record(self, fin) -> bytes:
+        """Чтение записи одного блока (b'' в конце файла)"""
+        header = fin.read(8)
+        if not header:
+            return b''
+        data_len = int.from_bytes(header[4:8], 'big')
+        return header + fin.read(data_len)
 
-                index = int.from_bytes(index_bytes, 'big')
-                data_len = int.from_bytes(fin.read(4), 'big')
-                rle_data = fin.read(data_len)
+    def decompress_block(self, record: bytes) -> bytes:
+        """Распаковка одного блока"""
+        if len(record) < 8 or int.from_bytes(record[4:8], 'big') != len(record) - 8:
+            raise ValueError("Повреждённые данные: размер блока не совпадает с заголовком")
+        index = int.from_bytes(record[:4], 'big')
+        rle_data = record[8:]
 
-                # Декодирование RLE
-                bwt_data = self.rle_decode(rle_data)
+        # Декодирование RLE
+        bwt_data = self.rle_decode(rle_data)
 
-                # Обратное BWT преобразование
-                original_data = self.inverse_bwt(bwt_data, index)
-                fout.write(original_data)
+        # Обратное BWT преобразование
+        return self.inverse_bwt(bwt_data, index)
 
-    def rle_decode(self, data: bytes) -> bytes:
-        """Декодирование RLE"""
-        decoded = bytearray()
-        i = 0
-        n = len(data)
-
-        while i < n:
-            if i + 1 < n and data[i] == data[i + 1]:
-                # Обработка повторяющихся символов
-                count = data[i + 1]
-                decoded.extend([data[i]] * count)
-                i += 2
+    def decompress_file(self, input_path: str, output_path: str):
+        """Распаковка файла (при workers > 1 блоки распаковываются параллельно)"""
+        with open(input_path, 'rb') as fin, open(output_path, 'wb') as fout:
+            entries = read_block_index(fin)
+            if entries is not None:
+                records = read_indexed_blocks(fin, entries)
             else:
-                decoded.append(data[i])
-                i += 1
+                records = iter(lambda: self.read_record(fin), b'')
+
+            for block in map_blocks(self.decompress_block, records, self.workers):
+                fout.write(block)
 
-        return bytes(decoded)
+    def rle_decode(self, data: bytes) -> bytes:
+        """Декодирование RLE"""
+        return rle_decode_bytes(data)
 
     def inverse_bwt(self, bwt_data: bytes, index: int) -> bytes:
         """Обратное преобразование BWT"""
-        if not bwt_data:
-            return b''
-
-        table = [bytearray() for _ in range(len(bwt_data))]
-        for _ in range(len(bwt_data)):
-            for i, c in enumerate(bwt_data):
-                table[i].insert(0, c)
-            table.sort()
-
-        original = table[index]
-        return bytes(original[:-1])  # Удаляем маркер конца
+        return inverse_bwt(bwt_data, index)
 
 
 # Пример использования
 if __name__ == "__main__":
-    compressor = BWT_RLE_Compressor(block_size=1024)
+    compressor = BWT_RLE_Compressor(block_size=900 * 1024)
 
     input_file = "D:\Pycharm projects\Help Natasha\enwik7.txt"
     compressed_file = "D:\Pycharm projects\Help Natasha\Compressed_files\compressed_bwt_rle.txt"
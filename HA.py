@@ -2,49 +2,285 @@ import os
 from heapq import heappush, heappop
 from collections import defaultdict
 
+from container import ContainerMixin
 
-class HuffmanCompressor:
-    def __init__(self, block_size=4096):
-        self.block_size = block_size
+# Наибольшая длина кода (как в deflate), помещается в 4 бита заголовка
+MAX_CODE_LENGTH = 15
 
-    class HuffmanNode:
-        def __init__(self, char=None, freq=0):
-            self.char = char
-            self.freq = freq
-            self.left = None
-            self.right = None
 
-        def __lt__(self, other):
-            return self.freq < other.freq
+def huffman_code_lengths(freq_table, max_length=MAX_CODE_LENGTH) -> dict:
+    """Длины кодов Хаффмана для символов, не длиннее max_length"""
+    if not freq_table:
+        return {}
+    if len(freq_table) == 1:
+        # Единственному символу всё равно нужен хотя бы один бит
+        return {char: 1 for char in freq_table}
 
-    def _build_tree(self, freq_table):
+    while True:
+        lengths = dict.fromkeys(freq_table, 0)
         heap = []
-        for char, freq in freq_table.items():
-            heappush(heap, self.HuffmanNode(char, freq))
+        for order, (char, freq) in enumerate(freq_table.items()):
+            heappush(heap, (freq, order, [char]))
 
+        order = len(heap)
         while len(heap) > 1:
-            left = heappop(heap)
-            right = heappop(heap)
-            merged = self.HuffmanNode(freq=left.freq + right.freq)
-            merged.left = left
-            merged.right = right
-            heappush(heap, merged)
+            freq_left, _, left = heappop(heap)
+            freq_right, _, right = heappop(heap)
+            # Все символы объединяемых поддеревьев опускаются на уровень ниже
+            for char in left:
+                lengths[char] += 1
+            for char in right:
+                lengths[char] += 1
+            heappush(heap, (freq_left + freq_right, order, left + right))
+            order += 1
+
+        if max(lengths.values()) <= max_length:
+            return lengths
+
+        # Слишком длинные коды: сглаживаем частоты и строим дерево заново
+        freq_table = {char: (freq >> 1) | 1 for char, freq in freq_table.items()}
+
+
+def canonical_codes(lengths: dict) -> dict:
+    """Канонические коды по длинам: символ -> (код, длина)
+
+    Коды назначаются по возрастанию (длина, символ), поэтому декодеру
+    достаточно знать только длины.
+    """
+    codes = {}
+    code = 0
+    prev_length = 0
+    for char, length in sorted(lengths.items(), key=lambda item: (item[1], item[0])):
+        if length == 0:
+            continue
+        code <<= length - prev_length
+        codes[char] = (code, length)
+        code += 1
+        prev_length = length
+    return codes
+
+
+def pack_code_lengths(lengths: dict) -> bytes:
+    """Упаковка длин кодов 256 байтовых символов сериями
+
+    Каждый байт: старшие 4 бита - длина кода, младшие - число
+    символов подряд с этой длиной минус 1.
+    """
+    packed = bytearray()
+    char = 0
+    while char < 256:
+        length = lengths.get(char, 0)
+        run = 1
+        while run < 16 and char + run < 256 and lengths.get(char + run, 0) == length:
+            run += 1
+        packed.append((length << 4) | (run - 1))
+        char += run
+    return bytes(packed)
+
+
+def unpack_code_lengths(data: bytes, pos: int = 0) -> (dict, int):
+    """Распаковка длин кодов: (символ -> длина, позиция после таблицы)"""
+    lengths = {}
+    char = 0
+    while char < 256:
+        if pos >= len(data):
+            raise ValueError("Повреждённые данные: таблица длин кодов обрывается")
+        length, run = data[pos] >> 4, (data[pos] & 0x0F) + 1
+        pos += 1
+        if char + run > 256:
+            raise ValueError("Повреждённые данные: таблица длин кодов длиннее 256 символов")
+        if length:
+            for c in range(char, char + run):
+                lengths[c] = length
+        char += run
+    return lengths, pos
+
+
+class BitWriter:
+    """Запись кодов переменной длины (старшим битом вперёд)
+
+    Коды копятся в целочисленном буфере и сбрасываются по 8 байт
+    в bytearray, заранее выделенный под size_hint байт.
+    """
+
+    def __init__(self, size_hint: int = 0):
+        self.buffer = bytearray(size_hint)
+        self.size = 0       # записано целых байт
+        self.acc = 0        # битовый буфер
+        self.acc_bits = 0   # число бит в буфере
+
+    @property
+    def bit_length(self) -> int:
+        return 8 * self.size + self.acc_bits
+
+    def write(self, code: int, length: int):
+        """Дописывает один код из length бит"""
+        self.acc = (self.acc << length) | code
+        self.acc_bits += length
+        if self.acc_bits >= 64:
+            self._flush()
+
+    def write_symbols(self, codes: dict, symbols):
+        """Дописывает коды всех символов; codes: символ -> (код, длина)"""
+        buffer = self.buffer
+        size = self.size
+        acc = self.acc
+        acc_bits = self.acc_bits
+        for char in symbols:
+            code, length = codes[char]
+            acc = (acc << length) | code
+            acc_bits += length
+            if acc_bits >= 64:
+                acc_bits -= 64
+                buffer[size:size + 8] = (acc >> acc_bits).to_bytes(8, 'big')
+                size += 8
+                acc &= (1 << acc_bits) - 1
+        self.size = size
+        self.acc = acc
+        self.acc_bits = acc_bits
+
+    def _flush(self):
+        """Сбрасывает целые байты из битового буфера"""
+        count = self.acc_bits // 8
+        self.acc_bits -= 8 * count
+        self.buffer[self.size:self.size + count] = (self.acc >> self.acc_bits).to_bytes(count, 'big')
+        self.size += count
+        self.acc &= (1 << self.acc_bits) - 1
+
+    def getvalue(self) -> bytes:
+        """Записанные биты, дополненные нулями до целого байта"""
+        padding = -self.acc_bits % 8
+        self.acc <<= padding
+        self.acc_bits += padding
+        self._flush()
+        del self.buffer[self.size:]
+        return bytes(self.buffer)
+
+
+# Число бит, разрешаемых одним обращением к таблице декодера
+DECODE_TABLE_BITS = 12
 
-        return heappop(heap) if heap else None
 
-    def _build_codes(self, root):
-        codes = {}
+class HuffmanDecoder:
+    """Табличный декодер префиксного кода
 
-        def traverse(node, code):
-            if node:
-                if node.char is not None:
-                    codes[node.char] = code
-                    return
-                traverse(node.left, code + '0')
-                traverse(node.right, code + '1')
+    Таблица на 2**table_bits записей по очередным table_bits битам
+    сразу даёт все целиком поместившиеся в них символы и их общую длину,
+    так что короткие коды декодируются пачками. Коды длиннее table_bits
+    дочитываются через словарь (длина, код) -> символ.
+    """
 
-        traverse(root, '')
-        return codes
+    def __init__(self, codes: dict, table_bits=DECODE_TABLE_BITS):
+        # codes: символ -> (код, длина)
+        self.max_length = max((length for _, length in codes.values()), default=0)
+        # Таблица всегда полной ширины, даже если все коды короче: иначе
+        # одно обращение разрешает лишь один-два символа. Хвост короче
+        # table_bits дочитывается медленным путём
+        self.table_bits = table_bits if self.max_length else 0
+        self.table = [(None, 0)] * (1 << self.table_bits)
+        self.long_codes = {}
+
+        for char, (code, length) in codes.items():
+            if code >> length:
+                raise ValueError("Повреждённые данные: длины кодов не задают префиксный код")
+            if length <= self.table_bits:
+                shift = self.table_bits - length
+                start = code << shift
+                self.table[start:start + (1 << shift)] = [(char, length)] * (1 << shift)
+            else:
+                self.long_codes[(length, code)] = char
+
+        # Многосимвольная таблица: индекс -> (символы, число бит)
+        table_mask = (1 << self.table_bits) - 1
+        self.multi_table = []
+        for index in range(1 << self.table_bits):
+            chars = []
+            used = 0
+            while True:
+                char, length = self.table[(index << used) & table_mask]
+                if not length or used + length > self.table_bits:
+                    break
+                chars.append(char)
+                used += length
+            self.multi_table.append((tuple(chars), used))
+
+    @classmethod
+    def from_lengths(cls, lengths: dict, table_bits=DECODE_TABLE_BITS):
+        """Декодер канонического кода по длинам кодов"""
+        return cls(canonical_codes(lengths), table_bits)
+
+    def decode(self, data: bytes, bit_count: int) -> list:
+        """Декодирует первые bit_count бит data в список символов"""
+        table = self.table
+        multi_table = self.multi_table
+        long_codes = self.long_codes
+        table_bits = self.table_bits
+        table_mask = (1 << table_bits) - 1
+        max_length = self.max_length
+        data_len = len(data)
+
+        decoded = []
+        acc = 0         # битовый буфер
+        acc_bits = 0    # число непрочитанных бит в буфере
+        pos = 0
+        # Пока до конца данных далеко, буфер подкачивается по 16 байт без проверок
+        bulk_limit = min(data_len, bit_count // 8) - 32
+
+        while True:
+            # Быстрый путь: пачка символов за одно обращение к таблице
+            length = 1
+            while pos <= bulk_limit and length:
+                # После длинного кода в буфере ещё могут оставаться биты
+                if acc_bits < table_bits:
+                    acc = ((acc & ((1 << acc_bits) - 1)) << 128) | int.from_bytes(data[pos:pos + 16], 'big')
+                    pos += 16
+                    acc_bits += 128
+                while acc_bits >= table_bits:
+                    chars, length = multi_table[(acc >> (acc_bits - table_bits)) & table_mask]
+                    if not length:
+                        break
+                    decoded += chars
+                    acc_bits -= length
+
+            if 8 * pos - acc_bits >= bit_count:
+                break
+
+            # Медленный путь: по одному символу в хвосте потока и для длинных кодов
+            while acc_bits < max_length and pos < data_len:
+                chunk = data[pos:pos + 8]
+                pos += len(chunk)
+                acc = ((acc & ((1 << acc_bits) - 1)) << (8 * len(chunk))) | int.from_bytes(chunk, 'big')
+                acc_bits += 8 * len(chunk)
+
+            if acc_bits >= table_bits:
+                char, length = table[(acc >> (acc_bits - table_bits)) & table_mask]
+            else:
+                char, length = table[(acc << (table_bits - acc_bits)) & table_mask]
+
+            if not length:
+                # Код длиннее таблицы
+                for length in range(table_bits + 1, min(max_length, acc_bits) + 1):
+                    code = (acc >> (acc_bits - length)) & ((1 << length) - 1)
+                    if (length, code) in long_codes:
+                        char = long_codes[(length, code)]
+                        break
+                else:
+                    raise ValueError("Повреждённые данные: неизвестный код Хаффмана")
+            if length > acc_bits:
+                raise ValueError("Повреждённые данные: поток кодов обрывается")
+
+            decoded.append(char)
+            acc_bits -= length
+
+        return decoded
+
+
+class HuffmanCompressor(ContainerMixin):
+    codec_name = 'huffman'
+
+    def __init__(self, block_size=4096, workers=1):
+        self.block_size = block_size
+        self.workers = workers
 
     def _encode_block(self, block):
         freq_table = defaultdict(int)
@@ -54,16 +290,16 @@ class HuffmanCompressor:
         if not freq_table:
             return b'', {}, 0
 
-        root = self._build_tree(freq_table)
-        codes = self._build_codes(root)
-
-        encoded_bits = ''.join(codes[byte] for byte in block)
-        padding = 8 - (len(encoded_bits)) % 8
-        encoded_bits += '0' * padding
+        lengths = huffman_code_lengths(freq_table)
 
-        encoded_bytes = bytes(int(encoded_bits[i:i+8], 2) for i in range(0, len(encoded_bits), 8))
+        # Размер результата известен заранее по частотам и длинам кодов
+        bit_count = sum(freq * lengths[char] for char, freq in freq_table.items())
+        writer = BitWriter((bit_count + 7) // 8)
+        writer.write_symbols(canonical_codes(lengths), block)
+        encoded_bytes = writer.getvalue()
+        padding = -bit_count % 8
 
-        return encoded_bytes, freq_table, padding
+        return encoded_bytes, lengths, padding
 
     def compress_file(self, input_path):
         original_size = os.path.getsize(input_path)
@@ -77,10 +313,10 @@ class HuffmanCompressor:
                     break
 
                 # Кодирование блока
-                encoded, freq_table, padding = self._encode_block(block)
+                encoded, lengths, padding = self._encode_block(block)
 
                 # Запись метаданных
-                metadata = self._pack_metadata(freq_table, padding)
+                metadata = self._pack_metadata(lengths, padding)
 
                 # Расчет размеров
                 total_compressed += len(metadata) + len(encoded)
@@ -96,13 +332,27 @@ class HuffmanCompressor:
         print(f"{'Compression Ratio:':<20} {compression_ratio:.2f}x")
         print(f"{'Space Saving:':<20} {efficiency:.1f}%")
 
-    def _pack_metadata(self, freq_table, padding):
+    def compress_block(self, block):
+        """Блок контейнера: метаданные и закодированные данные"""
+        encoded, lengths, padding = self._encode_block(block)
+        return self._pack_metadata(lengths, padding) + encoded
+
+    def decompress_block(self, payload):
+        if not payload:
+            raise ValueError("Повреждённые данные: пустой блок Хаффмана")
+        padding = payload[0]
+        lengths, pos = unpack_code_lengths(payload, 1)
+        if not lengths:
+            return b''
+        encoded = payload[pos:]
+        decoder = HuffmanDecoder.from_lengths(lengths)
+        return bytes(decoder.decode(encoded, len(encoded) * 8 - padding))
+
+    def _pack_metadata(self, lengths, padding):
         metadata = bytearray()
-        # Формат: [padding (1 byte)] [freq_table (256 * 4 bytes)]
+        # Формат: [padding (1 byte)] [длины канонических кодов сериями (16..256 bytes)]
         metadata.append(padding)
-        for i in range(256):
-            freq = freq_table.get(i, 0)
-            metadata += freq.to_bytes(4, 'big')
+        metadata += pack_code_lengths(lengths)
         return bytes(metadata)
 
 
@@ -1,65 +1,319 @@
 import os
 import struct
+from collections import deque
 
+from container import DEFAULT_CONTAINER_BLOCK_SIZE, ContainerMixin
+from parallel import read_blocks
 
-class LZ77Compressor:
-    def __init__(self, window_size=4096, lookahead_size=18):
+# Размер порции, которой читается вход при потоковом сжатии
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Сериализованный токен: distance, length и char (байт-заполнитель,
+# если совпадение занимает весь упреждающий буфер)
+TOKEN = struct.Struct('>HBB')
+
+
+class HashChainMatchFinder:
+    """Поиск совпадений LZ77 по цепочкам позиций с общим префиксом
+
+    Для каждого 3-байтового префикса хранится цепочка его позиций в окне
+    (по возрастанию), для 1- и 2-байтовых - такие же цепочки, по которым
+    находятся короткие совпадения. При max_chain=None просматриваются все
+    позиции окна, и результат совпадает с полным перебором: самое длинное
+    совпадение, из равных - самое дальнее. max_chain ограничивает цепочку
+    последними max_chain позициями.
+    """
+
+    MIN_MATCH = 3
+
+    def __init__(self, window_size: int, max_chain: int = None):
+        if window_size < 1:
+            raise ValueError(f"window_size должен быть положительным, получено {window_size}")
+        if max_chain is not None and max_chain < 1:
+            raise ValueError(f"max_chain должен быть положительным или None, получено {max_chain}")
+        self.window_size = window_size
+        self.max_chain = max_chain
+        # chains[k]: префикс длины k -> позиции, где он встречается
+        self.chains = (None, {}, {}, {})
+        self.inserted = 0
+
+    def insert(self, data, start: int, end: int):
+        """Добавляет в цепочки позиции start..end-1"""
+        chains = self.chains
+        len_data = len(data)
+        window_start = end - self.window_size
+        for pos in range(start, end):
+            key = 0
+            for k in range(1, self.MIN_MATCH + 1 if pos + self.MIN_MATCH <= len_data else len_data - pos + 1):
+                key = (key << 8) | data[pos + k - 1]
+                chain = chains[k].get(key)
+                if chain is None:
+                    chains[k][key] = deque((pos,), self.max_chain)
+                    continue
+                while chain[0] < window_start:
+                    chain.popleft()
+                    if not chain:
+                        break
+                chain.append(pos)
+
+        # Изредка выбрасываем префиксы, целиком ушедшие из окна
+        self.inserted += end - start
+        if self.inserted >= self.window_size:
+            self.inserted = 0
+            for table in chains[1:]:
+                for key in [key for key, chain in table.items() if chain[-1] < window_start]:
+                    del table[key]
+
+    def rebase(self, shift: int):
+        """Сдвигает позиции на shift после отбрасывания начала буфера"""
+        for table in self.chains[1:]:
+            for key, chain in list(table.items()):
+                chain = deque((pos - shift for pos in chain if pos >= shift), self.max_chain)
+                if chain:
+                    table[key] = chain
+                else:
+                    del table[key]
+
+    def find(self, data, i: int, end: int) -> (int, int):
+        """Лучшее совпадение для data[i:end]: (длина, расстояние)"""
+        window_start = i - self.window_size
+        available = end - i
+        best_length = 0
+        best_pos = -1
+
+        if available >= self.MIN_MATCH:
+            key = (data[i] << 16) | (data[i + 1] << 8) | data[i + 2]
+            chain = self.chains[3].get(key, ())
+            for j in chain:
+                if j < window_start:
+                    continue
+                # Более новые позиции дают только более короткие совпадения
+                limit = i - j if i - j < available else available
+                if limit <= best_length:
+                    break
+                length = self.MIN_MATCH if limit >= self.MIN_MATCH else 0
+                while length < limit and data[j + length] == data[i + length]:
+                    length += 1
+                if length > best_length:
+                    best_length = length
+                    best_pos = j
+                    if length == available:
+                        break
+
+        if best_length < self.MIN_MATCH:
+            # Совпадений из 3 байт нет: ищем самое дальнее из 2 или 1 байта
+            for k in (2, 1):
+                if available < k:
+                    continue
+                key = data[i] if k == 1 else (data[i] << 8) | data[i + 1]
+                for j in self.chains[k].get(key, ()):
+                    if j >= window_start:
+                        if j + k <= i:
+                            return k, i - j
+                        break
+
+        return best_length, (i - best_pos if best_length else 0)
+
+
+def expand_tokens(tokens, size: int, lookahead_size: int, history=b'') -> bytearray:
+    """Восстанавливает данные по токенам LZ77 в заранее выделенный буфер
+
+    tokens - тройки (distance, length, char) с char в виде числа; char
+    не записывается, если length == lookahead_size. history - уже
+    распакованный хвост перед токенами. Возвращает history + size байт.
+    """
+    out = bytearray(len(history) + size)
+    out[:len(history)] = history
+    pos = len(history)
+
+    for distance, length, char in tokens:
+        if length:
+            start = pos - distance
+            if distance <= 0 or start < 0:
+                raise ValueError(f"Некорректное смещение {distance} в позиции {pos}")
+            if distance >= length:
+                out[pos:pos + length] = out[start:start + length]
+            else:
+                # Перекрывающееся совпадение: повторяем период длины distance
+                out[pos:pos + length] = (out[start:pos] * (length // distance + 1))[:length]
+            pos += length
+        if length != lookahead_size:
+            out[pos] = char
+            pos += 1
+
+    if pos != len(out):
+        raise ValueError("Размер распакованных данных не совпадает с ожидаемым")
+    return out
+
+
+class LZ77Compressor(ContainerMixin):
+    codec_name = 'lz77'
+
+    def __init__(self, window_size=4096, lookahead_size=18, max_chain=None,
+                 block_size=DEFAULT_CONTAINER_BLOCK_SIZE, workers=1):
         self.window_size = window_size
         self.lookahead_size = lookahead_size
+        self.max_chain = max_chain
+        self.block_size = block_size
+        self.workers = workers
 
     def compress(self, data):
         """Сжимает данные с помощью алгоритма LZ77."""
-        compressed_data = []
+        return list(self.iter_tokens((data,)))
+
+    def iter_tokens(self, chunks):
+        """Токены LZ77 для данных, поступающих порциями
+
+        В буфере держится только окно, упреждающий буфер и текущая порция,
+        поэтому память не зависит от размера входа. Токены совпадают
+        с результатом compress() для склеенных порций.
+        """
+        finder = HashChainMatchFinder(self.window_size, self.max_chain)
+        chunks = iter(chunks)
+        # Запас после текущей позиции, чтобы и упреждающий буфер,
+        # и префиксы для цепочек были прочитаны целиком
+        margin = self.lookahead_size + HashChainMatchFinder.MIN_MATCH
+        data = b''
+        eof = False
         i = 0
-        len_data = len(data)
 
-        while i < len_data:
-            match_length = 0
-            match_distance = 0
-            next_char = data[i] if i < len_data else b''
-
-            # Устанавливаем границы окна и области поиска
-            window_start = max(0, i - self.window_size)
-            window = data[window_start:i]
-            lookahead = data[i:i + self.lookahead_size]
-
-            # Поиск наилучшего совпадения
-            for j in range(len(window)):
-                length = 0
-                while (length < len(lookahead) and
-                       j + length < len(window) and
-                       window[j + length] == lookahead[length]):
-                    length += 1
+        while True:
+            len_data = len(data)
+            if not eof and len_data - i < margin:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    eof = True
+                    continue
+                # Отбрасываем байты, ушедшие из окна
+                shift = max(0, i - self.window_size)
+                if shift:
+                    finder.rebase(shift)
+                    i -= shift
+                data = data[shift:] + bytes(chunk)
+                continue
+            if i >= len_data:
+                break
 
-                if length > match_length:
-                    match_length = length
-                    match_distance = len(window) - j
-                    if match_length < len(lookahead):
-                        next_char = lookahead[match_length:match_length + 1]
-                    else:
-                        next_char = b''
+            # Поиск наилучшего совпадения в окне
+            lookahead_end = min(i + self.lookahead_size, len_data)
+            match_length, match_distance = finder.find(data, i, lookahead_end)
 
             # Если совпадение найдено, добавляем его в сжатые данные
             if match_length > 0:
-                compressed_data.append((match_distance, match_length, next_char))
-                i += match_length + (1 if next_char else 0)
+                next_char = data[i + match_length:min(i + match_length + 1, lookahead_end)]
+                if not next_char and match_length < self.lookahead_size:
+                    # Данные кончились внутри совпадения: последний байт уходит
+                    # в next_char, чтобы пустой символ означал только совпадение
+                    # на весь упреждающий буфер
+                    match_length -= 1
+                    next_char = data[i + match_length:i + match_length + 1]
+                    if not match_length:
+                        match_distance = 0
+                yield match_distance, match_length, next_char
+                step = match_length + (1 if next_char else 0)
             else:
-                compressed_data.append((0, 0, data[i:i + 1]))
-                i += 1
+                yield 0, 0, data[i:i + 1]
+                step = 1
+
+            finder.insert(data, i, i + step)
+            i += step
+
+    def compress_stream(self, fin, fout, chunk_size=STREAM_CHUNK_SIZE):
+        """Потоковое сжатие из fin в fout; возвращает (исходный размер, сжатый размер)
+
+        Вход читается порциями по chunk_size байт, токены пишутся по мере
+        появления. Результат совпадает с serialize_compressed_data(compress(...)).
+        """
+        original_size = 0
+
+        def chunks():
+            nonlocal original_size
+            for chunk in read_blocks(fin, chunk_size):
+                original_size += len(chunk)
+                yield chunk
+
+        header = self.serialize_header()
+        fout.write(header)
+        compressed_size = len(header)
+
+        output = bytearray()
+        for token in self.iter_tokens(chunks()):
+            self.pack_token(output, token)
+            if len(output) >= chunk_size:
+                fout.write(output)
+                compressed_size += len(output)
+                output = bytearray()
+        fout.write(output)
+        compressed_size += len(output)
 
-        return compressed_data
+        return original_size, compressed_size
+
+    def decompress(self, binary_data):
+        """Распаковывает данные, сериализованные serialize_compressed_data()."""
+        if len(binary_data) < 4:
+            raise ValueError("Повреждённые данные: поток LZ77 короче заголовка")
+        _, lookahead_size = struct.unpack_from('>HH', binary_data)
+        return bytes(self._expand_serialized(bytes(binary_data[4:]), lookahead_size))
+
+    def decompress_stream(self, fin, fout, chunk_size=STREAM_CHUNK_SIZE):
+        """Потоковая распаковка из fin в fout; возвращает размер распакованных данных
+
+        Токены читаются порциями, в памяти держится только окно
+        уже распакованных данных.
+        """
+        window_size, lookahead_size = struct.unpack('>HH', fin.read(4))
+        history = b''
+        pending = b''
+        total = 0
+
+        for chunk in read_blocks(fin, chunk_size):
+            # Порция может оборваться посреди токена
+            body = pending + chunk
+            cut = len(body) - len(body) % TOKEN.size
+            body, pending = body[:cut], body[cut:]
+            out = self._expand_serialized(body, lookahead_size, history)
+            fout.write(memoryview(out)[len(history):])
+            total += len(out) - len(history)
+            history = bytes(out[-window_size:])
+
+        if pending:
+            raise ValueError("Обрезанный токен LZ77 в конце данных")
+        return total
+
+    @staticmethod
+    def _expand_serialized(body, lookahead_size, history=b''):
+        """Распаковывает последовательность сериализованных токенов"""
+        if len(body) % TOKEN.size:
+            raise ValueError("Обрезанный токен LZ77 в конце данных")
+        # Размер результата: все длины плюс символы неполных совпадений
+        lengths = body[2::TOKEN.size]
+        size = sum(lengths) + len(lengths) - lengths.count(lookahead_size)
+        return expand_tokens(TOKEN.iter_unpack(body), size, lookahead_size, history)
+
+    def compress_block(self, block):
+        """Блок контейнера: сериализованные токены блока (окно с начала блока)"""
+        return self.serialize_compressed_data(self.compress(block))
+
+    def decompress_block(self, payload):
+        return self.decompress(payload)
+
+    def serialize_header(self):
+        """Заголовок сжатых данных (размер окна и lookahead)"""
+        return struct.pack('>HH', self.window_size, self.lookahead_size)
+
+    @staticmethod
+    def pack_token(binary_data, token):
+        """Дописывает токен: distance (2 байта), length (1 байт) и char (1 байт)"""
+        distance, length, char = token
+        binary_data.extend(struct.pack('>HB', distance, length))
+        binary_data.extend(char if char else b'\x00')
 
     def serialize_compressed_data(self, compressed_data):
         """Сериализует сжатые данные в бинарный формат."""
-        binary_data = bytearray()
-
-        # Записываем заголовок (размер окна и lookahead)
-        binary_data.extend(struct.pack('>HH', self.window_size, self.lookahead_size))
+        binary_data = bytearray(self.serialize_header())
 
-        for distance, length, char in compressed_data:
-            # Упаковываем distance (2 байта), length (1 байт) и char (1 байт)
-            binary_data.extend(struct.pack('>HB', distance, length))
-            binary_data.extend(char if char else b'\x00')
+        for token in compressed_data:
+            self.pack_token(binary_data, token)
 
         return bytes(binary_data)
 
@@ -68,10 +322,96 @@ class LZ77Compressor:
         return original_size / compressed_size if compressed_size > 0 else 0
 
 
+class LZSSCompressor(ContainerMixin):
+    """LZSS: литералы без лишних полей и совпадения по 2 байта
+
+    Токены идут группами по 8, перед группой - байт флагов (бит 1 -
+    совпадение). Совпадение: 12 бит расстояния - 1 и 4 бита длины - 3,
+    поэтому окно 4096 байт, длина совпадения от 3 до 18.
+    """
+
+    codec_name = 'lzss'
+
+    WINDOW_SIZE = 4096
+    MIN_MATCH = 3
+    MAX_MATCH = 18
+
+    def __init__(self, max_chain=None, block_size=DEFAULT_CONTAINER_BLOCK_SIZE, workers=1):
+        self.max_chain = max_chain
+        self.block_size = block_size
+        self.workers = workers
+
+    def compress(self, data) -> bytes:
+        finder = HashChainMatchFinder(self.WINDOW_SIZE, self.max_chain)
+        output = bytearray()
+        flags_pos = 0
+        flag_bit = 8
+        n = len(data)
+        i = 0
+
+        while i < n:
+            if flag_bit == 8:
+                flags_pos = len(output)
+                output.append(0)
+                flag_bit = 0
+
+            length, distance = finder.find(data, i, min(i + self.MAX_MATCH, n))
+            if length >= self.MIN_MATCH:
+                output[flags_pos] |= 1 << flag_bit
+                token = ((distance - 1) << 4) | (length - self.MIN_MATCH)
+                output += bytes((token >> 8, token & 0xFF))
+            else:
+                length = 1
+                output.append(data[i])
+            flag_bit += 1
+
+            finder.insert(data, i, i + length)
+            i += length
+
+        return bytes(output)
+
+    def decompress(self, data) -> bytes:
+        out = bytearray()
+        n = len(data)
+        i = 0
+
+        while i < n:
+            flags = data[i]
+            i += 1
+            for bit in range(8):
+                if i >= n:
+                    break
+                if not flags >> bit & 1:
+                    out.append(data[i])
+                    i += 1
+                    continue
+                if i + 1 >= n:
+                    raise ValueError("Обрезанное совпадение LZSS в конце данных")
+                token = (data[i] << 8) | data[i + 1]
+                i += 2
+                distance = (token >> 4) + 1
+                length = (token & 0x0F) + self.MIN_MATCH
+                start = len(out) - distance
+                if start < 0:
+                    raise ValueError(f"Некорректное смещение {distance} в позиции {len(out)}")
+                if distance >= length:
+                    out += out[start:start + length]
+                else:
+                    out += (out[start:] * (length // distance + 1))[:length]
+
+        return bytes(out)
+
+    def compress_block(self, block):
+        return self.compress(block)
+
+    def decompress_block(self, payload):
+        return self.decompress(payload)
+
+
 def read_file(filename):
     """Читает содержимое файла в бинарном режиме."""
     with open(filename, 'rb') as file:
-        return file.read(1024*100)
+        return file.read()
 
 
 def write_compressed_file(filename, compressed_data):
@@ -80,20 +420,19 @@ def write_compressed_file(filename, compressed_data):
         file.write(compressed_data)
 
 
+def decompress_file(input_filename, output_filename):
+    """Распаковывает файл, сжатый compress_file()."""
+    with open(input_filename, 'rb') as fin, open(output_filename, 'wb') as fout:
+        return LZ77Compressor().decompress_stream(fin, fout)
+
+
 def compress_file(input_filename, output_filename):
     try:
-        original_data = read_file(input_filename)
-        original_size = len(original_data)
-
         compressor = LZ77Compressor()
 
-        compressed_tuples = compressor.compress(original_data)
-
-        compressed_binary = compressor.serialize_compressed_data(compressed_tuples)
-        compressed_size = len(compressed_binary)
-
-        # Сохраняем сжатый файл
-        write_compressed_file(output_filename, compressed_binary)
+        # Сжимаем потоком: файл целиком в память не читается
+        with open(input_filename, 'rb') as fin, open(output_filename, 'wb') as fout:
+            original_size, compressed_size = compressor.compress_stream(fin, fout)
 
         compression_ratio = compressor.calculate_compression_ratio(original_size, compressed_size)
 
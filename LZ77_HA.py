@@ -1,10 +1,25 @@
 import os
 import struct
+import time
 import heapq
 from collections import defaultdict, Counter
+from itertools import islice
+
+from HA import BitWriter, HuffmanDecoder
+from LZ77 import STREAM_CHUNK_SIZE, TOKEN, LZ77Compressor, expand_tokens
+from container import DEFAULT_CONTAINER_BLOCK_SIZE, ContainerMixin
+from parallel import read_blocks
+from pipeline_stats import measure
+
+# Число токенов LZ77 в одном блоке Хаффмана при потоковом сжатии
+TOKENS_PER_BLOCK = 64 * 1024
 
 
 class HuffmanCoder:
+    # Дерево Хаффмана глубины d требует не меньше F(d + 2) символов
+    # (числа Фибоначчи), поэтому глубже 100 корректное дерево не бывает
+    MAX_TREE_DEPTH = 100
+
     def __init__(self):
         self.codes = {}
         self.reverse_codes = {}
@@ -45,20 +60,15 @@ class HuffmanCoder:
         self.build_codes(node.right, current_code + "1")
 
     def encode_data(self, data):
-        encoded_bits = ""
-        for item in data:
-            encoded_bits += self.codes[item]
-        return encoded_bits
-
-    def decode_data(self, encoded_bits):
-        current_code = ""
-        decoded_data = []
-        for bit in encoded_bits:
-            current_code += bit
-            if current_code in self.reverse_codes:
-                decoded_data.append(self.reverse_codes[current_code])
-                current_code = ""
-        return decoded_data
+        codes = {char: (int(code, 2), len(code)) for char, code in self.codes.items()}
+        writer = BitWriter()
+        writer.write_symbols(codes, data)
+        bit_length = writer.bit_length
+        return writer.getvalue(), bit_length
+
+    def decode_data(self, encoded_bytes, bit_length):
+        decoder = HuffmanDecoder({char: (int(code, 2), len(code)) for char, code in self.codes.items()})
+        return decoder.decode(encoded_bytes, bit_length)
 
     def serialize_tree(self, node, tree_bytes):
         if node.char is not None:
@@ -78,71 +88,92 @@ class HuffmanCoder:
             self.serialize_tree(node.right, tree_bytes)
 
     @staticmethod
-    def deserialize_tree(tree_data, index=0):
+    def deserialize_tree(tree_data, index=0, depth=0):
         if index >= len(tree_data):
-            return None, index
+            raise ValueError("Повреждённые данные: дерево Хаффмана обрывается")
+        if depth > HuffmanCoder.MAX_TREE_DEPTH:
+            raise ValueError("Повреждённые данные: слишком глубокое дерево Хаффмана")
 
         if tree_data[index] == 1:
-            index += 1
-            char_type = chr(tree_data[index])
-            index += 1
+            char_type = chr(tree_data[index + 1]) if index + 1 < len(tree_data) else ''
+            size = 1 if char_type == 'C' else 2
+            index += 2
+            if char_type not in ('C', 'D', 'L'):
+                raise ValueError(f"Повреждённые данные: неизвестный символ {char_type!r} в дереве Хаффмана")
+            if index + size > len(tree_data):
+                raise ValueError("Повреждённые данные: дерево Хаффмана обрывается")
             if char_type == 'C':
-                char = tree_data[index:index + 1]
-                index += 1
+                char = (char_type, bytes(tree_data[index:index + 1]))
             else:
-                char = (char_type, struct.unpack('>H', tree_data[index:index + 2])[0])
-                index += 2
-            return HuffmanCoder.HuffmanNode(char=char), index
-        else:
+                char = (char_type, struct.unpack_from('>H', tree_data, index)[0])
+            return HuffmanCoder.HuffmanNode(char=char), index + size
+        elif tree_data[index] == 0:
             index += 1
-            left, index = HuffmanCoder.deserialize_tree(tree_data, index)
-            right, index = HuffmanCoder.deserialize_tree(tree_data, index)
+            left, index = HuffmanCoder.deserialize_tree(tree_data, index, depth + 1)
+            right, index = HuffmanCoder.deserialize_tree(tree_data, index, depth + 1)
             return HuffmanCoder.HuffmanNode(left=left, right=right), index
+        raise ValueError(f"Повреждённые данные: неизвестный узел {tree_data[index]} в дереве Хаффмана")
+
 
+class LZ77HuffmanCompressor(ContainerMixin):
+    codec_name = 'lz77-huffman'
+    stage_stats = True
 
-class LZ77HuffmanCompressor:
-    def __init__(self, window_size=4096, lookahead_size=18):
+    def __init__(self, window_size=4096, lookahead_size=18, max_chain=None,
+                 block_size=DEFAULT_CONTAINER_BLOCK_SIZE, workers=1):
         self.window_size = window_size
         self.lookahead_size = lookahead_size
+        self.max_chain = max_chain
+        self.block_size = block_size
+        self.workers = workers
 
     def compress(self, data):
-        """LZ77 compression stage"""
-        compressed = []
-        i = 0
-        len_data = len(data)
-
-        while i < len_data:
-            match_length = 0
-            match_distance = 0
-            next_char = data[i] if i < len_data else b''
-
-            window_start = max(0, i - self.window_size)
-            window = data[window_start:i]
-            lookahead = data[i:i + self.lookahead_size]
-
-            for j in range(len(window)):
-                length = 0
-                while (length < len(lookahead) and
-                       j + length < len(window) and
-                       window[j + length] == lookahead[length]):
-                    length += 1
-
-                if length > match_length:
-                    match_length = length
-                    match_distance = len(window) - j
-                    if match_length < len(lookahead):
-                        next_char = lookahead[match_length:match_length + 1]
-                    else:
-                        next_char = b''
-
-            if match_length > 0:
-                compressed.append((match_distance, match_length, next_char))
-                i += match_length + (1 if next_char else 0)
-            else:
-                compressed.append((0, 0, data[i:i + 1]))
-                i += 1
-
-        return compressed
+        """LZ77 compression stage (hash-chain match finder from LZ77.py)"""
+        return LZ77Compressor(self.window_size, self.lookahead_size, self.max_chain).compress(data)
+
+    def compress_stream(self, fin, fout, tokens_per_block=TOKENS_PER_BLOCK, chunk_size=STREAM_CHUNK_SIZE,
+                        stats=None):
+        """Streaming compression: LZ77 tokens are Huffman coded block by block
+
+        Returns (original size, compressed size). A single block gives
+        the same bytes as serialize_compressed_data(). If stats is given,
+        the LZ77 and Huffman stages are timed per token block.
+        """
+        start = time.perf_counter()
+        original_size = 0
+
+        def chunks():
+            nonlocal original_size
+            for chunk in read_blocks(fin, chunk_size):
+                original_size += len(chunk)
+                yield chunk
+
+        lz77 = LZ77Compressor(self.window_size, self.lookahead_size, self.max_chain)
+        tokens = lz77.iter_tokens(chunks())
+
+        header = self.serialize_header()
+        fout.write(header)
+        compressed_size = len(header)
+
+        while True:
+            consumed = original_size
+            with measure(stats, 'lz77') as stage:
+                block = list(islice(tokens, tokens_per_block))
+                stage.bytes_in = original_size - consumed
+                stage.bytes_out = len(block) * TOKEN.size
+            if not block:
+                break
+            with measure(stats, 'huffman', stage.bytes_out) as stage:
+                record = self.serialize_block(*self.huffman_compress(block))
+                stage.bytes_out = len(record)
+            if stats is not None:
+                stats.blocks += 1
+            fout.write(record)
+            compressed_size += len(record)
+
+        if stats is not None:
+            stats.elapsed += time.perf_counter() - start
+        return original_size, compressed_size
 
     def huffman_compress(self, lz77_data):
         """Huffman compression stage"""
@@ -162,27 +193,101 @@ class LZ77HuffmanCompressor:
         tree = huffman.build_huffman_tree(freq_dict)
         huffman.build_codes(tree)
 
-        # Кодирование данных
-        encoded_bits = huffman.encode_data(freq_data)
+        # Кодирование данных (биты сразу упаковываются в байты)
+        encoded_bytes, bit_length = huffman.encode_data(freq_data)
 
         # Сериализация дерева и данных
         tree_bytes = bytearray()
         huffman.serialize_tree(tree, tree_bytes)
 
-        # Упаковка битов в байты
-        encoded_bytes = bytearray()
-        for i in range(0, len(encoded_bits), 8):
-            byte = encoded_bits[i:i + 8]
-            if len(byte) < 8:
-                byte += '0' * (8 - len(byte))  # Дополнение
-            encoded_bytes.append(int(byte, 2))
-
-        return tree_bytes, encoded_bytes, len(encoded_bits)
+        return tree_bytes, encoded_bytes, bit_length
 
     def serialize_compressed_data(self, tree_bytes, encoded_bytes, bit_length):
         """Сериализация сжатых данных"""
-        header = struct.pack('>HHQ', self.window_size, self.lookahead_size, bit_length)
-        return header + tree_bytes + encoded_bytes
+        return self.serialize_header() + self.serialize_block(tree_bytes, encoded_bytes, bit_length)
+
+    def decompress(self, binary_data, stats=None):
+        """Распаковка данных, записанных compress_stream() или serialize_compressed_data()"""
+        binary_data = bytes(binary_data)
+        if len(binary_data) < 4:
+            raise ValueError("Повреждённые данные: обрезанный заголовок LZ77+Huffman")
+        window_size, lookahead_size = struct.unpack_from('>HH', binary_data)
+        pos = 4
+        history = b''
+        parts = []
+
+        while pos < len(binary_data):
+            block_start = pos
+            with measure(stats, 'huffman') as stage:
+                if pos + 8 > len(binary_data):
+                    raise ValueError("Повреждённые данные: обрезанный заголовок блока Хаффмана")
+                bit_length, = struct.unpack_from('>Q', binary_data, pos)
+                tree, pos = HuffmanCoder.deserialize_tree(binary_data, pos + 8)
+                huffman = HuffmanCoder()
+                huffman.build_codes(tree)
+
+                end = pos + (bit_length + 7) // 8
+                symbols = huffman.decode_data(binary_data[pos:end], bit_length)
+                pos = end
+                tokens, size = self.symbols_to_tokens(symbols, lookahead_size)
+                stage.bytes_in = end - block_start
+                stage.bytes_out = len(tokens) * TOKEN.size
+
+            # Каждый блок распаковывается вслед за окном предыдущего
+            with measure(stats, 'lz77', stage.bytes_out) as stage:
+                out = expand_tokens(tokens, size, lookahead_size, history)
+                stage.bytes_out = size
+            parts.append(memoryview(out)[len(history):])
+            history = bytes(out[-window_size:])
+
+        return b''.join(parts)
+
+    @staticmethod
+    def symbols_to_tokens(symbols, lookahead_size):
+        """Символы ('D', distance), ('L', length), [('C', char)] -> токены и размер данных"""
+        tokens = []
+        size = 0
+        i = 0
+        count = len(symbols)
+        while i + 1 < count:
+            if symbols[i][0] != 'D' or symbols[i + 1][0] != 'L':
+                raise ValueError("Повреждённые данные: нарушен порядок символов токена LZ77")
+            distance = symbols[i][1]
+            length = symbols[i + 1][1]
+            i += 2
+            char = 0
+            if i < count and symbols[i][0] == 'C':
+                char = symbols[i][1][0]
+                i += 1
+                size += 1
+            elif length != lookahead_size:
+                raise ValueError("Токен LZ77 без символа и без полного совпадения")
+            tokens.append((distance, length, char))
+            size += length
+        if i != count:
+            raise ValueError("Обрезанный токен LZ77 в конце блока")
+        return tokens, size
+
+    def compress_block(self, block, stats=None):
+        """Блок контейнера: данные serialize_compressed_data() для блока"""
+        with measure(stats, 'lz77', len(block)) as stage:
+            tokens = self.compress(block)
+            stage.bytes_out = len(tokens) * TOKEN.size
+        with measure(stats, 'huffman', stage.bytes_out) as stage:
+            payload = self.serialize_compressed_data(*self.huffman_compress(tokens))
+            stage.bytes_out = len(payload)
+        return payload
+
+    def decompress_block(self, payload, stats=None):
+        return self.decompress(payload, stats)
+
+    def serialize_header(self):
+        return struct.pack('>HH', self.window_size, self.lookahead_size)
+
+    @staticmethod
+    def serialize_block(tree_bytes, encoded_bytes, bit_length):
+        """Блок: число бит, дерево Хаффмана и закодированные токены"""
+        return struct.pack('>Q', bit_length) + tree_bytes + encoded_bytes
 
     def calculate_compression_ratio(self, original_size, compressed_size):
         return original_size / compressed_size if compressed_size > 0 else 0
@@ -190,7 +295,7 @@ class LZ77HuffmanCompressor:
 
 def read_file(filename):
     with open(filename, 'rb') as file:
-        return file.read(1024*1024)
+        return file.read()
 
 
 def write_compressed_file(filename, data):
@@ -198,21 +303,20 @@ def write_compressed_file(filename, data):
         file.write(data)
 
 
+def decompress_file(input_filename, output_filename):
+    """Распаковка файла, сжатого compress_file()"""
+    with open(input_filename, 'rb') as fin:
+        data = LZ77HuffmanCompressor().decompress(fin.read())
+    write_compressed_file(output_filename, data)
+    return len(data)
+
+
 def compress_file(input_filename, output_filename):
     try:
-        # Чтение файла
-        original_data = read_file(input_filename)
-        original_size = len(original_data)
-
-        # Сжатие
+        # Потоковое сжатие: файл читается порциями, токены кодируются блоками
         compressor = LZ77HuffmanCompressor()
-        lz77_data = compressor.compress(original_data)
-        tree_bytes, encoded_bytes, bit_length = compressor.huffman_compress(lz77_data)
-        compressed_data = compressor.serialize_compressed_data(tree_bytes, encoded_bytes, bit_length)
-        compressed_size = len(compressed_data)
-
-        # Запись сжатого файла
-        write_compressed_file(output_filename, compressed_data)
+        with open(input_filename, 'rb') as fin, open(output_filename, 'wb') as fout:
+            original_size, compressed_size = compressor.compress_stream(fin, fout)
 
         # Расчет коэффициента сжатия
         compression_ratio = compressor.calculate_compression_ratio(original_size, compressed_size)
@@ -1,84 +1,406 @@
+import heapq
 import os
 import struct
-from collections import defaultdict
 
-
-class LZ78Compressor:
-    def __init__(self):
-        self.dictionary = defaultdict(int)
+from HA import BitWriter
+from container import DEFAULT_CONTAINER_BLOCK_SIZE, ContainerMixin
+
+# Заголовок файла: сигнатура и предельный размер словаря (0 - без ограничения)
+FILE_HEADER = struct.Struct('>4sI')
+FILE_MAGIC = b'LZ78'
+
+# Заголовок блока контейнера: предельный размер словаря (0 - без ограничения)
+BLOCK_HEADER = struct.Struct('>I')
+
+
+class LeastUsedLeafPruner:
+    """Учёт фраз ограниченного словаря LZ78 и вытеснение наименее используемого листа
+
+    Кодер и декодер видят одни и те же токены (код префикса, байт), ведут
+    по ним одинаковый учёт (родитель, число детей и число использований
+    кода как префикса) и поэтому вытесняют одну и ту же фразу: лист
+    с наименьшим числом использований, из равных - с меньшим кодом.
+    Освободившийся код сразу получает новая фраза.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.size = 0
+        # Код 0 - пустая фраза, корень дерева; он никогда не вытесняется
+        self.parent = [0] * (max_size + 1)
+        self.children = [0] * (max_size + 1)
+        self.uses = [0] * (max_size + 1)
+        # Кандидаты в жертвы (использования, код); устаревшие записи
+        # отбрасываются при извлечении
+        self.heap = []
+
+    def add_phrase(self, prefix: int) -> (int, int):
+        """Учитывает токен с префиксом prefix; (код новой фразы, вытесненный код или None)
+
+        Если единственный лист - сам prefix (словарь вытянут в цепочку),
+        новая фраза не добавляется и возвращается (None, None).
+        """
+        parent, children, uses, heap = self.parent, self.children, self.uses, self.heap
+
+        if prefix:
+            uses[prefix] += 1
+            if not children[prefix]:
+                heapq.heappush(heap, (uses[prefix], prefix))
+
+        if self.size < self.max_size:
+            self.size += 1
+            code = self.size
+            evicted = None
+        else:
+            code = evicted = self._pop_victim(prefix)
+            if code is None:
+                return None, None
+            old_parent = parent[code]
+            if old_parent:
+                children[old_parent] -= 1
+                if not children[old_parent]:
+                    heapq.heappush(heap, (uses[old_parent], old_parent))
+
+        parent[code] = prefix
+        children[code] = 0
+        uses[code] = 0
+        if prefix:
+            children[prefix] += 1
+        heapq.heappush(heap, (0, code))
+
+        # Устаревшие записи не должны раздувать кучу сверх предела словаря
+        if len(heap) > 4 * self.max_size:
+            self.heap = [(uses[c], c) for c in range(1, self.size + 1) if not children[c]]
+            heapq.heapify(self.heap)
+        return code, evicted
+
+    def _pop_victim(self, keep: int) -> int:
+        """Извлекает наименее используемый лист, кроме keep (родителя новой фразы)"""
+        heap, children, uses = self.heap, self.children, self.uses
+        skipped = None
+        while heap:
+            count, code = heapq.heappop(heap)
+            if children[code] or uses[code] != count:
+                continue
+            if code == keep:
+                skipped = (count, code)
+                continue
+            if skipped:
+                heapq.heappush(heap, skipped)
+            return code
+        if skipped:
+            heapq.heappush(heap, skipped)
+        return None
+
+
+def decoder_dict_size(max_dict_size, count):
+    """Размер словаря для распаковки count токенов, сжатых с пределом max_dict_size
+
+    Каждый токен добавляет не больше одной фразы, поэтому при пределе
+    не меньше count фразы не вытесняются и данные распаковываются как
+    без ограничения - без таблиц на весь (возможно, повреждённый) предел.
+    """
+    return max_dict_size if max_dict_size and max_dict_size < count else None
+
+
+class LZ78Compressor(ContainerMixin):
+    codec_name = 'lz78'
+
+    def __init__(self, max_dict_size=None, block_size=DEFAULT_CONTAINER_BLOCK_SIZE, workers=1):
+        """max_dict_size - предельное число фраз в словаре (None - без ограничения);
+        распаковка должна использовать то же значение"""
+        if max_dict_size is not None and max_dict_size < 1:
+            raise ValueError(f"max_dict_size должен быть положительным, получено {max_dict_size}")
+        self.max_dict_size = max_dict_size
+        self.block_size = block_size
+        self.workers = workers
+        self._release()
+
+    def _release(self):
+        """Отпускает словарь: он существует только на время compress(),
+        поэтому не держит память между вызовами и не попадает в задачи
+        пула вместе с compress_block"""
+        self.trie = {}
+        self.next_code = 1
+        self.pruner = None
+        self.keys = None
+
+    def reset(self):
+        """Очищает словарь; compress() делает это перед каждым потоком"""
+        # Словарь фраз в виде префиксного дерева: фраза задаётся кодом
+        # родительской фразы и последним байтом, ключ - (код << 8) | байт
+        self.trie = {}
         self.next_code = 1  # Начинаем с 1, так как 0 означает пустую строку
+        self.pruner = None
+        self.keys = None
+        if self.max_dict_size:
+            self.pruner = LeastUsedLeafPruner(self.max_dict_size)
+            self.keys = [0] * (self.max_dict_size + 1)  # код -> ключ в trie
 
     def compress(self, data):
-        """Сжимает данные с помощью алгоритма LZ78"""
+        """Сжимает данные с помощью алгоритма LZ78
+
+        data - bytes; результат - пары (код префикса, байт).
+        """
+        self.reset()
         compressed = []
-        current_phrase = ""
-
-        for char in data:
-            current_phrase += char
-            if current_phrase not in self.dictionary:
-                # Добавляем новую фразу в словарь
-                self.dictionary[current_phrase] = self.next_code
-                # Находим код префикса (все кроме последнего символа)
-                prefix_code = self.dictionary.get(current_phrase[:-1], 0)
-                # Сохраняем (код префикса, новый символ)
-                compressed.append((prefix_code, char))
-                self.next_code += 1
-                current_phrase = ""
+        trie = self.trie
+        pruner = self.pruner
+        keys = self.keys
+        next_code = self.next_code
+        code = 0  # Код текущей фразы
+        prefix_code = 0
+
+        for byte in data:
+            key = (code << 8) | byte
+            child = trie.get(key)
+            if child is None:
+                # Добавляем новую фразу в словарь и сохраняем (код префикса, новый байт)
+                compressed.append((code, byte))
+                if pruner is None:
+                    trie[key] = next_code
+                    next_code += 1
+                else:
+                    new_code, evicted = pruner.add_phrase(code)
+                    if evicted is not None:
+                        del trie[keys[evicted]]
+                    if new_code is not None:
+                        keys[new_code] = key
+                        trie[key] = new_code
+                code = 0
+            else:
+                prefix_code = code
+                code = child
 
         # Обработка оставшейся фразы (если есть)
-        if current_phrase:
-            prefix_code = self.dictionary.get(current_phrase[:-1], 0)
-            compressed.append((prefix_code, current_phrase[-1]))
+        if code:
+            compressed.append((prefix_code, data[-1]))
 
+        self._release()
         return compressed
 
     def decompress(self, compressed_data):
-        dictionary = {0: ""}
-        decompressed = []
-        next_code = 1
-
-        for code, char in compressed_data:
-            # Получаем фразу из словаря
-            phrase = dictionary[code] + char
-            decompressed.append(phrase)
-            # Добавляем новую фразу в словарь
-            dictionary[next_code] = phrase
-            next_code += 1
-
-        return "".join(decompressed)
+        """Восстанавливает bytes из пар (код префикса, байт)
+
+        Фраза каждого кода хранится не строкой, а положением
+        её первого вхождения в уже распакованных данных.
+        """
+        decompressed = bytearray()
+        pruner = None
+        if self.max_dict_size:
+            pruner = LeastUsedLeafPruner(self.max_dict_size)
+            starts = [0] * (self.max_dict_size + 1)
+            lengths = [0] * (self.max_dict_size + 1)
+        else:
+            starts = [0]  # Код 0 - пустая фраза
+            lengths = [0]
+
+        for code, byte in compressed_data:
+            # Код может ссылаться только на уже добавленные фразы
+            if code > (len(starts) - 1 if pruner is None else pruner.size):
+                raise ValueError(f"Повреждённые данные: неизвестный код фразы LZ78 {code}")
+            start = starts[code]
+            length = lengths[code]
+            # Новая фраза = фраза префикса + байт
+            if pruner is None:
+                starts.append(len(decompressed))
+                lengths.append(length + 1)
+            else:
+                new_code = pruner.add_phrase(code)[0]
+                if new_code is not None:
+                    starts[new_code] = len(decompressed)
+                    lengths[new_code] = length + 1
+            decompressed += decompressed[start:start + length]
+            decompressed.append(byte)
+
+        return bytes(decompressed)
 
     def serialize_compressed_data(self, compressed_data):
         """Сериализует сжатые данные в бинарный формат"""
         binary_data = bytearray()
 
-        for code, char in compressed_data:
+        for code, byte in compressed_data:
             # Упаковываем код (4 байта) и символ (1 байт)
-            binary_data.extend(struct.pack('>I', code))
-            binary_data.extend(char.encode('utf-8') if isinstance(char, str) else char)
+            binary_data.extend(struct.pack('>IB', code, byte))
 
         return bytes(binary_data)
 
     def deserialize_compressed_data(self, binary_data):
         """Десериализует сжатые данные из бинарного формата"""
-        compressed_data = []
-        index = 0
-
-        while index < len(binary_data):
-            # Читаем код (4 байта)
-            code = struct.unpack('>I', binary_data[index:index + 4])[0]
-            index += 4
-            # Читаем символ (1 байт)
-            char = binary_data[index:index + 1].decode('utf-8')
-            index += 1
-            compressed_data.append((code, char))
-
-        return compressed_data
+        return list(struct.iter_unpack('>IB', binary_data))
+
+    def compress_block(self, block):
+        """Блок контейнера: размер словаря и сериализованные токены блока со своим словарём"""
+        return BLOCK_HEADER.pack(self.max_dict_size or 0) + self.serialize_compressed_data(self.compress(block))
+
+    def decompress_block(self, payload):
+        """Распаковка блока с размером словаря из его заголовка"""
+        if len(payload) < BLOCK_HEADER.size or (len(payload) - BLOCK_HEADER.size) % 5:
+            raise ValueError("Повреждённые данные: некорректный размер блока LZ78")
+        count = (len(payload) - BLOCK_HEADER.size) // 5
+        max_dict_size = decoder_dict_size(BLOCK_HEADER.unpack_from(payload)[0], count)
+        if max_dict_size == decoder_dict_size(self.max_dict_size, count):
+            decoder = self
+        else:
+            decoder = LZ78Compressor(max_dict_size)
+        return decoder.decompress(decoder.deserialize_compressed_data(payload[BLOCK_HEADER.size:]))
 
     def calculate_compression_ratio(self, original_size, compressed_size):
         """Рассчитывает коэффициент сжатия"""
         return original_size / compressed_size if compressed_size > 0 else 0
 
 
+class LZWCompressor(ContainerMixin):
+    """LZW с кодами переменной ширины и сбросом словаря
+
+    Коды 0-255 - байты, 256 - код очистки словаря. Ширина кода растёт
+    от 9 бит до max_bits по мере заполнения словаря. Заполненный словарь
+    больше не растёт; если после этого коэффициент сжатия падает
+    (проверка каждые check_interval байт), пишется код очистки
+    и словарь строится заново. Память ограничена 2 ** max_bits фразами.
+    """
+
+    codec_name = 'lzw'
+    CLEAR_CODE = 256
+    FIRST_CODE = 257
+    MIN_BITS = 9
+
+    def __init__(self, max_bits=16, check_interval=10000, block_size=DEFAULT_CONTAINER_BLOCK_SIZE, workers=1):
+        if not self.MIN_BITS <= max_bits <= 24:
+            raise ValueError(f"max_bits должен быть от {self.MIN_BITS} до 24, получено {max_bits}")
+        self.max_bits = max_bits
+        self.check_interval = check_interval
+        self.block_size = block_size
+        self.workers = workers
+
+    def compress_block(self, block):
+        return self.compress(block)
+
+    def decompress_block(self, payload):
+        return self.decompress(payload)
+
+    def compress(self, data):
+        """Сжимает bytes; результат - байт max_bits и поток кодов"""
+        writer = BitWriter()
+        writer.write(self.max_bits, 8)
+        if not data:
+            return writer.getvalue()
+
+        max_codes = 1 << self.max_bits
+        trie = {}
+        next_code = self.FIRST_CODE
+        width = self.MIN_BITS
+        # Контроль коэффициента сжатия после заполнения словаря
+        reset_pos = 0
+        reset_bits = writer.bit_length
+        checkpoint = 0
+        last_ratio = 0.0
+
+        code = data[0]
+        for i in range(1, len(data)):
+            byte = data[i]
+            key = (code << 8) | byte
+            child = trie.get(key)
+            if child is not None:
+                code = child
+                continue
+
+            writer.write(code, width)
+            if next_code < max_codes:
+                trie[key] = next_code
+                next_code += 1
+                if next_code > (1 << width) and width < self.max_bits:
+                    width += 1
+            elif i >= checkpoint:
+                checkpoint = i + self.check_interval
+                ratio = (i - reset_pos) / (writer.bit_length - reset_bits)
+                if ratio < last_ratio:
+                    # Словарь устарел: очищаем и строим заново
+                    writer.write(self.CLEAR_CODE, width)
+                    trie = {}
+                    next_code = self.FIRST_CODE
+                    width = self.MIN_BITS
+                    reset_pos = i
+                    reset_bits = writer.bit_length
+                    checkpoint = 0
+                    last_ratio = 0.0
+                else:
+                    last_ratio = ratio
+            code = byte
+
+        writer.write(code, width)
+        return writer.getvalue()
+
+    def decompress(self, binary_data):
+        """Восстанавливает bytes из результата compress()"""
+        if not binary_data:
+            return b''
+        max_bits = binary_data[0]
+        if not self.MIN_BITS <= max_bits <= 24:
+            raise ValueError(f"Некорректная ширина кода LZW: {max_bits}")
+        max_codes = 1 << max_bits
+
+        # Фраза кода - отрезок уже распакованных данных (начало, длина)
+        starts = [0] * max_codes
+        lengths = [0] * max_codes
+        next_code = self.FIRST_CODE
+        width = self.MIN_BITS
+        prev_start = prev_length = -1  # Предыдущая фраза (нет после очистки)
+
+        decompressed = bytearray()
+        acc = 0
+        acc_bits = 0
+        pos = 1
+        len_data = len(binary_data)
+
+        while True:
+            # Декодер добавляет фразу на шаг позже кодера,
+            # поэтому ширину кода определяет next_code + 1
+            if next_code + 1 > (1 << width) and width < max_bits:
+                width += 1
+            while acc_bits < width and pos < len_data:
+                acc = (acc << 8) | binary_data[pos]
+                pos += 1
+                acc_bits += 8
+            if acc_bits < width:
+                break  # Остались только биты выравнивания
+            acc_bits -= width
+            code = acc >> acc_bits
+            acc &= (1 << acc_bits) - 1
+
+            if code == self.CLEAR_CODE:
+                next_code = self.FIRST_CODE
+                width = self.MIN_BITS
+                prev_start = prev_length = -1
+                continue
+
+            start = len(decompressed)
+            if code < 256:
+                decompressed.append(code)
+                length = 1
+            elif code < next_code:
+                length = lengths[code]
+                decompressed += decompressed[starts[code]:starts[code] + length]
+            elif code == next_code and prev_length >= 0:
+                # Фраза, которую кодер добавил только что: предыдущая + её первый байт
+                decompressed += decompressed[prev_start:prev_start + prev_length]
+                decompressed.append(decompressed[prev_start])
+                length = prev_length + 1
+            else:
+                raise ValueError(f"Повреждённые данные: неизвестный код LZW {code}")
+
+            # Новая фраза - предыдущая плюс первый байт текущей; в выходе
+            # она как раз начинается с предыдущей фразы
+            if prev_length >= 0 and next_code < max_codes:
+                starts[next_code] = prev_start
+                lengths[next_code] = prev_length + 1
+                next_code += 1
+            prev_start = start
+            prev_length = length
+
+        return bytes(decompressed)
+
+
 def read_file(filename, mode='r'):
     """Читает содержимое файла"""
     with open(filename, mode) as file:
@@ -91,20 +413,21 @@ def write_file(filename, data, mode='w'):
         file.write(data)
 
 
-def compress_file(input_filename, output_filename):
+def compress_file(input_filename, output_filename, max_dict_size=None):
     try:
         # Читаем исходный файл
         original_data = read_file(input_filename, 'rb')
         original_size = len(original_data)
 
         # Создаем компрессор
-        compressor = LZ78Compressor()
+        compressor = LZ78Compressor(max_dict_size)
 
         # Сжимаем данные
-        compressed_data = compressor.compress(original_data.decode('utf-8'))
+        compressed_data = compressor.compress(original_data)
 
-        # Сериализуем сжатые данные
-        compressed_binary = compressor.serialize_compressed_data(compressed_data)
+        # Сериализуем сжатые данные; размер словаря пишется в заголовок
+        compressed_binary = (FILE_HEADER.pack(FILE_MAGIC, max_dict_size or 0)
+                             + compressor.serialize_compressed_data(compressed_data))
         compressed_size = len(compressed_binary)
 
         # Сохраняем сжатый файл
@@ -128,20 +451,25 @@ def compress_file(input_filename, output_filename):
 def decompress_file(input_filename, output_filename):
     """Распаковывает файл, сжатый с помощью LZ78"""
     try:
-        # Читаем сжатый файл
-        compressed_binary = read_file(input_filename, 'rb')
+        # Читаем сжатый файл целиком: он может быть больше read_file()
+        with open(input_filename, 'rb') as file:
+            compressed_binary = file.read()
 
-        # Создаем компрессор
-        compressor = LZ78Compressor()
+        magic, max_dict_size = FILE_HEADER.unpack_from(compressed_binary.ljust(FILE_HEADER.size, b'\0'))
+        if magic != FILE_MAGIC:
+            raise ValueError(f"Файл '{input_filename}' не является архивом LZ78")
 
         # Десериализуем данные
-        compressed_data = compressor.deserialize_compressed_data(compressed_binary)
+        compressed_data = LZ78Compressor().deserialize_compressed_data(compressed_binary[FILE_HEADER.size:])
+
+        # Создаем компрессор с размером словаря из заголовка
+        compressor = LZ78Compressor(decoder_dict_size(max_dict_size, len(compressed_data)))
 
         # Распаковываем данные
         decompressed_data = compressor.decompress(compressed_data)
 
         # Сохраняем распакованный файл
-        write_file(output_filename, decompressed_data, 'w')
+        write_file(output_filename, decompressed_data, 'wb')
 
         print(f"Файл '{input_filename}' успешно распакован в '{output_filename}'")
         return True
@@ -1,182 +1,158 @@
-import heapq
+import os
+import struct
 from collections import Counter
-import json
-
-
-class LZ78Compressor:
-    def compress(self, data):
-        """Сжимает данные с помощью алгоритма LZ78."""
-        dictionary = {}
-        result = []
-        current_index = 1
-        i = 0
-
-        while i < len(data):
-            current_phrase = ""
-            while i < len(data) and (current_phrase + data[i]) in dictionary:
-                current_phrase += data[i]
-                i += 1
-
-            if i < len(data):
-                current_phrase += data[i]
-                i += 1
-
-            prefix = current_phrase[:-1]
-            last_char = current_phrase[-1] if len(current_phrase) > 0 else ''
-            prefix_index = dictionary.get(prefix, 0)
-            result.append((prefix_index, last_char))
-
-            if current_phrase not in dictionary:
-                dictionary[current_phrase] = current_index
-                current_index += 1
-
-        return result
-
-    def decompress(self, compressed_data):
-        """Восстанавливает данные из сжатого формата LZ78."""
-        dictionary = {0: ''}
-        result = []
-        current_index = 1
-
-        for index, char in compressed_data:
-            phrase = dictionary[index] + char
-            result.append(phrase)
-            dictionary[current_index] = phrase
-            current_index += 1
-
-        return ''.join(result)
-
-    def compress_to_bytes(self, data):
-        """Конвертирует сжатые данные в байтовый поток."""
-        byte_stream = bytearray()
-        for index, char in self.compress(data):
-            byte_stream.extend(index.to_bytes(4, 'big'))
-            byte_stream.extend(ord(char).to_bytes(4, 'big'))
-        return bytes(byte_stream)
-
-    def decompress_from_bytes(self, byte_data):
-        """Восстанавливает данные из байтового потока."""
-        compressed = []
-        for i in range(0, len(byte_data), 8):
-            index = int.from_bytes(byte_data[i:i + 4], 'big')
-            char = chr(int.from_bytes(byte_data[i + 4:i + 8], 'big'))
-            compressed.append((index, char))
-        return self.decompress(compressed)
-
-class HuffmanNode:
-    def __init__(self, char, freq):
-        self.char = char
-        self.freq = freq
-        self.left = None
-        self.right = None
-
-    def __lt__(self, other):
-        return self.freq < other.freq
-
-class HuffmanCompressor:
-    def build_huffman_tree(self, data):
-        frequency = Counter(data)
-        heap = [HuffmanNode(char, freq) for char, freq in frequency.items()]
-        heapq.heapify(heap)
-
-        while len(heap) > 1:
-            left = heapq.heappop(heap)
-            right = heapq.heappop(heap)
-            merged = HuffmanNode(None, left.freq + right.freq)
-            merged.left = left
-            merged.right = right
-            heapq.heappush(heap, merged)
-
-        return heap[0]
-
-    def build_codes(self, node, current_code="", codes={}):
-        if node is None:
-            return
-
-        if node.char is not None:
-            codes[node.char] = current_code
-            return
-
-        self.build_codes(node.left, current_code + "0", codes)
-        self.build_codes(node.right, current_code + "1", codes)
-        return codes
 
-    def compress(self, data):
-        """Сжимает данные с помощью алгоритма Хаффмана."""
-        root = self.build_huffman_tree(data)
-        codes = self.build_codes(root)
-        encoded = ''.join([codes[char] for char in data])
-        return encoded, codes
+from HA import BitWriter, HuffmanDecoder, canonical_codes, huffman_code_lengths, pack_code_lengths, unpack_code_lengths
+from LZ78 import LZ78Compressor, decoder_dict_size
+from container import ContainerMixin
+from parallel import map_blocks, read_blocks
+
+# Размер блока: каждый блок сжимается со своим словарём LZ78
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+
+# Заголовок файла: сигнатура и предельный размер словаря (0 - без ограничения)
+FILE_HEADER = struct.Struct('>4sI')
+FILE_MAGIC = b'LZ8H'
 
-    def decompress(self, encoded_data, codes):
-        """Распаковывает данные, сжатые алгоритмом Хаффмана."""
-        reverse_mapping = {v: k for k, v in codes.items()}
-        current_code = ""
-        result = []
+# Заголовок блока: исходный размер, число токенов, размер потока кодов
+# префиксов, число бит потока байтов, размер таблицы длин кодов Хаффмана
+# и предельный размер словаря (0 - без ограничения)
+BLOCK_HEADER = struct.Struct('>IIIIHI')
 
-        for bit in encoded_data:
-            current_code += bit
-            if current_code in reverse_mapping:
-                result.append(reverse_mapping[current_code])
-                current_code = ""
 
-        return ''.join(result)
+class LZ78HuffmanCompressor(ContainerMixin):
+    """LZ78 + Хаффман над байтами
 
+    Вход читается блоками. Токены (код префикса, байт) блока разносятся
+    по двум потокам: коды префиксов пишутся минимальной шириной (у i-го
+    токена код не больше i), байты кодируются каноническим кодом
+    Хаффмана, таблица которого занимает несколько десятков байт.
+    """
 
-class LZ78HuffmanCompressor:
-    def __init__(self):
-        self.lz78 = LZ78Compressor()
-        self.huffman = HuffmanCompressor()
+    codec_name = 'lz78-huffman'
+
+    def __init__(self, block_size=DEFAULT_BLOCK_SIZE, max_dict_size=None, workers=1):
+        self.block_size = block_size
+        self.max_dict_size = max_dict_size
+        self.workers = workers
+        self.lz78 = LZ78Compressor(max_dict_size)
         self.original_size = 0  # Размер исходных данных в байтах
         self.compressed_size = 0  # Размер сжатых данных в байтах
 
-    def compress_file(self, input_path, output_path):
-        # Чтение и расчет исходного размера
-        with open(input_path, 'r', encoding='utf-8') as f:
-            original_data = f.read()
-            self.original_size = len(original_data.encode('utf-8'))
-
-            # Сжатие LZ78
-            lz78_bytes = self.lz78.compress_to_bytes(original_data)
-            lz78_str = lz78_bytes.decode('latin-1')
-
-            # Сжатие Хаффманом
-            huffman_encoded, huffman_codes = self.huffman.compress(lz78_str)
-
-            # Формирование метаданных
-            padding = 8 - (len(huffman_encoded) % 8)
-            huffman_encoded += '0' * padding
-
-            # Сериализация кодов Хаффмана
-            serializable_codes = {ord(k): v for k, v in huffman_codes.items()}
-            metadata = {
-                'padding': padding,
-                'codes': serializable_codes
-            }
-
-            # Запись в файл
-            with open(output_path, 'wb') as f:
-                # Запись метаданных
-                metadata_json = json.dumps(metadata).encode('utf-8')
-                f.write(len(metadata_json).to_bytes(4, 'big'))
-                f.write(metadata_json)
-
-                # Запись сжатых данных
-                byte_array = bytearray()
-                for i in range(0, len(huffman_encoded), 8):
-                    byte = int(huffman_encoded[i:i + 8], 2)
-                    byte_array.append(byte)
-                f.write(bytes(byte_array))
-
-        # Расчет общего размера сжатого файла
-        metadata_json = json.dumps(metadata).encode('utf-8')
-        self.compressed_size = (
-                4 +  # Размер заголовка метаданных
-                len(metadata_json) +
-                len(byte_array))
+    def code_widths(self, count):
+        """Ширина кода префикса каждого из count токенов блока"""
+        width = 0
+        for i in range(count):
+            if i == 1 << width and (not self.max_dict_size or i <= self.max_dict_size):
+                width += 1
+            yield width
+
+    def encode_codes(self, codes):
+        writer = BitWriter()
+        for code, width in zip(codes, self.code_widths(len(codes))):
+            writer.write(code, width)
+        return writer.getvalue()
+
+    def decode_codes(self, data, count):
+        codes = []
+        acc = 0
+        acc_bits = 0
+        pos = 0
+        for width in self.code_widths(count):
+            while acc_bits < width:
+                if pos >= len(data):
+                    raise ValueError("Повреждённые данные: поток кодов префиксов LZ78 обрывается")
+                acc = (acc << 8) | data[pos]
+                pos += 1
+                acc_bits += 8
+            acc_bits -= width
+            codes.append(acc >> acc_bits)
+            acc &= (1 << acc_bits) - 1
+        return codes
+
+    def compress_block(self, block):
+        tokens = self.lz78.compress(block)
+        codes = [code for code, _ in tokens]
+        chars = bytes(byte for _, byte in tokens)
+
+        # Байты токенов - каноническим кодом Хаффмана
+        freq_table = Counter(chars)
+        lengths = huffman_code_lengths(freq_table)
+        char_bits = sum(freq * lengths[char] for char, freq in freq_table.items())
+        writer = BitWriter((char_bits + 7) // 8)
+        writer.write_symbols(canonical_codes(lengths), chars)
+
+        table = pack_code_lengths(lengths)
+        codes_data = self.encode_codes(codes)
+        header = BLOCK_HEADER.pack(len(block), len(tokens), len(codes_data), char_bits, len(table),
+                                   self.max_dict_size or 0)
+        return header + table + codes_data + writer.getvalue()
+
+    def read_record(self, fin):
+        """Читает запись одного блока, b'' в конце файла"""
+        header = fin.read(BLOCK_HEADER.size)
+        if not header:
+            return b''
+        if len(header) < BLOCK_HEADER.size:
+            raise ValueError("Повреждённые данные: блок LZ78 короче заголовка")
+        _, _, codes_size, char_bits, table_size, _ = BLOCK_HEADER.unpack(header)
+        return header + fin.read(table_size + codes_size + (char_bits + 7) // 8)
+
+    def decompress_block(self, record):
+        if len(record) < BLOCK_HEADER.size:
+            raise ValueError("Повреждённые данные: блок LZ78 короче заголовка")
+        original_size, count, codes_size, char_bits, table_size, max_dict_size = BLOCK_HEADER.unpack_from(record)
+        if len(record) != BLOCK_HEADER.size + table_size + codes_size + (char_bits + 7) // 8:
+            raise ValueError("Повреждённые данные: размер блока LZ78 не совпадает с заголовком")
+        # Коды всех токенов, кроме первого, занимают хотя бы бит
+        if count > 8 * codes_size + 1:
+            raise ValueError("Повреждённые данные: число токенов LZ78 больше потока кодов")
+        max_dict_size = decoder_dict_size(max_dict_size, count)
+        if max_dict_size != decoder_dict_size(self.max_dict_size, count):
+            # Блок сжат с другим размером словаря: ширина кодов и вытеснение фраз зависят от него
+            return LZ78HuffmanCompressor(self.block_size, max_dict_size).decompress_block(record)
+        pos = BLOCK_HEADER.size
+        lengths, _ = unpack_code_lengths(record, pos)
+        pos += table_size
+        codes = self.decode_codes(record[pos:pos + codes_size], count)
+        pos += codes_size
+
+        chars = []
+        if count:
+            decoder = HuffmanDecoder.from_lengths(lengths)
+            chars = decoder.decode(record[pos:pos + (char_bits + 7) // 8], char_bits)
+        if len(chars) != count:
+            raise ValueError("Повреждённые данные: число байтов токенов LZ78 не совпадает")
+
+        data = self.lz78.decompress(zip(codes, chars))
+        if len(data) != original_size:
+            raise ValueError("Повреждённые данные: размер блока не совпадает")
+        return data
 
+    def compress_file(self, input_path, output_path):
+        with open(input_path, 'rb') as fin, open(output_path, 'wb') as fout:
+            fout.write(FILE_HEADER.pack(FILE_MAGIC, self.max_dict_size or 0))
+            blocks = read_blocks(fin, self.block_size)
+            for record in map_blocks(self.compress_block, blocks, self.workers):
+                fout.write(record)
+
+        self.original_size = os.path.getsize(input_path)
+        self.compressed_size = os.path.getsize(output_path)
         return self.get_compression_ratio()
 
+    def decompress_file(self, input_path, output_path):
+        with open(input_path, 'rb') as fin, open(output_path, 'wb') as fout:
+            magic, max_dict_size = FILE_HEADER.unpack(fin.read(FILE_HEADER.size))
+            if magic != FILE_MAGIC:
+                raise ValueError(f"Файл '{input_path}' не является архивом LZ78+Huffman")
+            # Размер словаря берётся из заголовка файла; настройки
+            # самого компрессора при этом не меняются
+            decoder = LZ78HuffmanCompressor(self.block_size, max_dict_size or None, self.workers)
+
+            records = iter(lambda: decoder.read_record(fin), b'')
+            for block in map_blocks(decoder.decompress_block, records, self.workers):
+                fout.write(block)
+
     def get_compression_ratio(self):
 
         if self.compressed_size == 0:
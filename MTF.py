@@ -0,0 +1,119 @@
+def mtf_encode_list(data: bytes) -> bytes:
+    """MTF кодирование на списке (эталонная реализация)"""
+    dictionary = list(range(256))
+    encoded = []
+    for byte in data:
+        idx = dictionary.index(byte)
+        encoded.append(idx)
+        dictionary.pop(idx)
+        dictionary.insert(0, byte)
+    return bytes(encoded)
+
+
+def mtf_decode_list(data: bytes) -> bytes:
+    """MTF декодирование на списке (эталонная реализация)"""
+    dictionary = list(range(256))
+    decoded = []
+    for idx in data:
+        char = dictionary[idx]
+        decoded.append(char)
+        dictionary.pop(idx)
+        dictionary.insert(0, char)
+    return bytes(decoded)
+
+
+def mtf_encode_table(data: bytes) -> bytes:
+    """MTF кодирование на таблице рангов в bytearray
+
+    Поиск и сдвиг таблицы выполняются внутри bytearray (memchr/memmove),
+    а повтор символа на вершине таблицы не трогает её вовсе.
+    """
+    table = bytearray(range(256))
+    encoded = bytearray(len(data))
+    for i, byte in enumerate(data):
+        if table[0] != byte:
+            idx = table.index(byte)
+            encoded[i] = idx
+            del table[idx]
+            table.insert(0, byte)
+    return bytes(encoded)
+
+
+def mtf_decode_table(data: bytes) -> bytes:
+    """MTF декодирование на таблице рангов в bytearray"""
+    table = bytearray(range(256))
+    decoded = bytearray(len(data))
+    for i, idx in enumerate(data):
+        char = table[idx]
+        decoded[i] = char
+        if idx:
+            del table[idx]
+            table.insert(0, char)
+    return bytes(decoded)
+
+
+# Доступные реализации: имя -> (кодер, декодер)
+MTF_ENGINES = {
+    'list': (mtf_encode_list, mtf_decode_list),
+    'table': (mtf_encode_table, mtf_decode_table),
+}
+DEFAULT_MTF_ENGINE = 'table'
+
+
+def get_mtf_engine(engine: str = DEFAULT_MTF_ENGINE):
+    """Пара функций (кодер, декодер) для реализации MTF по имени"""
+    if engine not in MTF_ENGINES:
+        raise ValueError(f"Неизвестная реализация MTF: {engine!r}, доступны: {', '.join(MTF_ENGINES)}")
+    return MTF_ENGINES[engine]
+
+
+def mtf_encode(data: bytes, engine: str = DEFAULT_MTF_ENGINE) -> bytes:
+    """MTF кодирование выбранной реализацией"""
+    return get_mtf_engine(engine)[0](data)
+
+
+def mtf_decode(data: bytes, engine: str = DEFAULT_MTF_ENGINE) -> bytes:
+    """MTF декодирование выбранной реализацией"""
+    return get_mtf_engine(engine)[1](data)
+
+
+def benchmark_mtf(data: bytes, repeat: int = 3) -> dict:
+    """Сравнение реализаций MTF: имя -> (кодирование МБ/с, декодирование МБ/с)"""
+    import time
+
+    results = {}
+    size_mb = len(data) / (1024 * 1024)
+    for name, (encode, decode) in MTF_ENGINES.items():
+        encode_time = decode_time = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            encoded = encode(data)
+            encode_time = min(encode_time, time.perf_counter() - start)
+
+            start = time.perf_counter()
+            decoded = decode(encoded)
+            decode_time = min(decode_time, time.perf_counter() - start)
+
+        assert decoded == data
+        results[name] = (size_mb / encode_time, size_mb / decode_time)
+    return results
+
+
+# Пример использования
+if __name__ == "__main__":
+    import sys
+    from BWT import bwt_transform
+
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], 'rb') as f:
+            test_data = f.read(900 * 1024)
+    else:
+        test_data = b"Burrows-Wheeler transform groups similar contexts together. " * 15000
+
+    # MTF работает на выходе BWT, поэтому и замеряем на нём
+    bwt_data, _ = bwt_transform(test_data)
+
+    print("{:<8} {:<14} {:<14}".format('Engine', 'Encode MB/s', 'Decode MB/s'))
+    print("-" * 36)
+    for name, (encode_speed, decode_speed) in benchmark_mtf(bwt_data).items():
+        print("{:<8} {:<14.2f} {:<14.2f}".format(name, encode_speed, decode_speed))
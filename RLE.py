@@ -1,3 +1,31 @@
+import re
+
+try:
+    import numpy as np
+except ImportError:  # без NumPy серии ищутся по XOR соседних байт
+    np = None
+
+from container import DEFAULT_CONTAINER_BLOCK_SIZE, ContainerMixin
+
+# Самая длинная серия в одном токене: два байта и счётчик 0..255
+MAX_RUN = 257
+
+# Подряд идущие нули в XOR соседних байт - серии одинаковых байт
+ZERO_RUN_PATTERN = re.compile(rb'\0+')
+
+
+def adjacent_xor(data: bytes) -> bytes:
+    """Байты data[i] ^ data[i + 1]: ноль там, где байт равен следующему
+
+    Считается одним XOR двух больших целых, без цикла по байтам.
+    """
+    if len(data) < 2:
+        return b''
+    left = int.from_bytes(data[:-1], 'big')
+    right = int.from_bytes(data[1:], 'big')
+    return (left ^ right).to_bytes(len(data) - 1, 'big')
+
+
 def rle_encode(data):
     """Функция для сжатия данных с помощью алгоритма RLE."""
     if not data:
@@ -45,22 +73,109 @@ def calculate_compression_ratio(original, encoded):
         return 0  # Избегаем деления на ноль
     return len(original) / len(encoded)
 
+def find_runs(data: bytes):
+    """(начало, длина) каждой серии из двух и более одинаковых байт
+
+    С NumPy границы серий находятся через diff/nonzero по всему буферу,
+    без NumPy - поиском нулевых участков в adjacent_xor(); в обоих случаях
+    цикл Python идёт по сериям, а не по байтам.
+    """
+    if np is not None and len(data) > 1:
+        values = np.frombuffer(data, dtype=np.uint8)
+        # 1 там, где байт равен следующему; фронты этой маски - границы серий
+        equal = np.concatenate(([0], (values[1:] == values[:-1]).view(np.int8), [0]))
+        edges = np.diff(equal)
+        starts = np.nonzero(edges == 1)[0]
+        ends = np.nonzero(edges == -1)[0]
+        return zip(starts.tolist(), (ends - starts + 1).tolist())
+    return ((match.start(), match.end() - match.start() + 1)
+            for match in ZERO_RUN_PATTERN.finditer(adjacent_xor(data)))
+
+
+def rle_encode_bytes(data: bytes) -> bytes:
+    """Двоичный RLE: серия записывается как два одинаковых байта и число
+    оставшихся повторов (0..255), одиночный байт - как есть
+
+    Участки без серий копируются срезами, длинные серии кодируются
+    сразу целыми токенами по MAX_RUN байт.
+    """
+    data = bytes(data)
+    encoded = bytearray()
+    pos = 0
+
+    for start, length in find_runs(data):
+        encoded += data[pos:start]
+        byte = data[start]
+        full, rest = divmod(length, MAX_RUN)
+        encoded += bytes((byte, byte, MAX_RUN - 2)) * full
+        if rest > 1:
+            encoded += bytes((byte, byte, rest - 2))
+        elif rest:
+            encoded.append(byte)
+        pos = start + length
+
+    encoded += data[pos:]
+    return bytes(encoded)
+
+
+def rle_decode_bytes(data: bytes) -> bytes:
+    """Декодирование двоичного RLE
+
+    Начало очередного токена серии - первая пара одинаковых байт после
+    предыдущего токена (поиск нуля в adjacent_xor()), как при побайтовом
+    разборе; байты между токенами - литералы и копируются срезами.
+    """
+    data = bytes(data)
+    pairs = adjacent_xor(data)
+    decoded = bytearray()
+    pos = 0
+
+    while True:
+        start = pairs.find(0, pos)
+        if start < 0:
+            break
+        if start + 2 >= len(data):
+            raise ValueError("Обрезанный токен серии RLE в конце данных")
+        decoded += data[pos:start]
+        decoded += data[start:start + 1] * (data[start + 2] + 2)
+        pos = start + 3
+
+    decoded += data[pos:]
+    return bytes(decoded)
+
+
+class RLECompressor(ContainerMixin):
+    """RLE-кодек для блочного контейнера"""
+
+    codec_name = 'rle'
+
+    def __init__(self, block_size=DEFAULT_CONTAINER_BLOCK_SIZE, workers=1):
+        self.block_size = block_size
+        self.workers = workers
+
+    def compress_block(self, block: bytes) -> bytes:
+        return rle_encode_bytes(block)
+
+    def decompress_block(self, data: bytes) -> bytes:
+        return rle_decode_bytes(data)
+
 # Пример использования
 if __name__ == "__main__":
 
     input_file = 'D:\Pycharm projects\Help Natasha\enwik7.txt'
-    output_file = 'D:\Pycharm projects\Help Natasha\Compressed_files\compressed_RLE.txt'
+    output_file = 'D:\Pycharm projects\Help Natasha\Compressed_files\compressed_RLE.bin'
 
-    with open(input_file, 'rb') as f, open(output_file, 'w') as fout:
+    with open(input_file, 'rb') as f, open(output_file, 'wb') as fout:
         original_text = f.read(1024 * 1024)
 
         # Размер оригинального текста
         original_size = len(original_text)
         print(f"Размер оригинального текста: {original_size} байт")
 
-        # Сжатие текста
-        encoded_text = rle_encode(original_text)
+        # Сжатие текста (двоичный RLE: байты и счётчики не смешиваются)
+        encoded_text = rle_encode_bytes(original_text)
         fout.write(encoded_text)
+        assert rle_decode_bytes(encoded_text) == original_text
 
         # Размер закодированного текста
         encoded_size = len(encoded_text)
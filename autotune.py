@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import sys
+import time
+
+from cli import CODECS
+from container import CONTAINER_BLOCK
+from parallel import map_blocks
+
+KB = 1024
+MB = 1024 * 1024
+
+# Настраиваемый параметр каждого кодека и его кандидаты по возрастанию
+# затрат (времени или памяти): из почти равных выбирается более дешёвый
+TUNABLE = {
+    'rle': ('block_size', [64 * KB, 256 * KB, 1 * MB]),
+    'huffman': ('block_size', [4 * KB, 16 * KB, 64 * KB, 256 * KB, 1 * MB]),
+    'lz77': ('window_size', [256, 512, 1024, 2048, 4096, 8192, 16384, 32768]),
+    'lz77-huffman': ('window_size', [256, 512, 1024, 2048, 4096, 8192, 16384, 32768]),
+    'lzss': ('block_size', [16 * KB, 64 * KB, 256 * KB, 1 * MB]),
+    'lz78': ('max_dict_size', [1 << 12, 1 << 14, 1 << 16, 1 << 18]),
+    'lzw': ('max_bits', [12, 14, 16, 18, 20]),
+    'lz78-huffman': ('block_size', [64 * KB, 256 * KB, 1 * MB]),
+    'bwt-rle': ('block_size', [16 * KB, 64 * KB, 100 * KB, 300 * KB, 900 * KB]),
+    'bwt-mtf-huffman': ('block_size', [16 * KB, 64 * KB, 100 * KB, 300 * KB, 900 * KB]),
+    'bwt-mtf-rle-huffman': ('block_size', [16 * KB, 64 * KB, 100 * KB, 300 * KB, 900 * KB]),
+}
+
+# Параметры выборки: блоков на кандидата, общий объём выборки на кандидата
+# и размер блока, если настраивается не размер блока, а окно или словарь
+SAMPLE_COUNT = 4
+SAMPLE_BUDGET = 1 * MB
+SAMPLE_BLOCK_SIZE = 64 * KB
+
+# Допустимая потеря в коэффициенте сжатия ради более дешёвого кандидата
+TOLERANCE = 0.01
+
+# Кэш в памяти: ключ выборки -> результат autotune()
+_cache = {}
+
+
+def source_size(source) -> int:
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source)
+    return len(source)
+
+
+def read_ranges(source, ranges) -> list:
+    """Куски source (байты или путь к файлу) по списку (начало, длина)"""
+    if not isinstance(source, (str, os.PathLike)):
+        return [bytes(source[start:start + length]) for start, length in ranges]
+    chunks = []
+    with open(source, 'rb') as fin:
+        for start, length in ranges:
+            fin.seek(start)
+            chunks.append(fin.read(length))
+    return chunks
+
+
+def sample_ranges(size: int, block_size: int, count: int = SAMPLE_COUNT, budget: int = SAMPLE_BUDGET) -> list:
+    """Равномерно разнесённые по входу блоки размером block_size
+
+    Блоков не больше count и не больше, чем помещается в budget байт,
+    но хотя бы один. Если вход короче блока, выборка - весь вход.
+    """
+    if size <= block_size:
+        return [(0, size)]
+    count = max(1, min(count, budget // block_size, size // block_size))
+    step = (size - block_size) // max(1, count - 1)
+    return [(i * step, block_size) for i in range(count)]
+
+
+def fingerprint(source, count: int = SAMPLE_COUNT, sample_size: int = 4 * KB) -> str:
+    """Отпечаток входа по его размеру и нескольким небольшим кускам
+
+    Файл целиком не читается, поэтому отпечаток дешёв и для больших входов.
+    """
+    size = source_size(source)
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    for chunk in read_ranges(source, sample_ranges(size, sample_size, count, count * sample_size)):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _evaluate_candidate(task) -> dict:
+    """Сжимает выборку кодеком с одним значением параметра
+
+    Выборка затем распаковывается кодеком с настройками по умолчанию (как
+    при чтении контейнера через cli): параметр, который не сохраняется
+    в данных блока, настраивать нельзя.
+    """
+    codec_name, kwargs, blocks = task
+    codec = CODECS[codec_name](**kwargs)
+    original = compressed = 0
+    payloads = []
+    start = time.perf_counter()
+    for block in blocks:
+        payload = codec.compress_block(block)
+        payloads.append(payload)
+        original += len(block)
+        compressed += len(payload) + CONTAINER_BLOCK.size
+    elapsed = time.perf_counter() - start
+
+    reader = CODECS[codec_name]()
+    for block, payload in zip(blocks, payloads):
+        if reader.decompress_block(payload) != block:
+            raise ValueError(f"{codec_name} с {kwargs}: выборка не восстанавливается "
+                             f"кодеком с настройками по умолчанию")
+    return {
+        'original_size': original,
+        'compressed_size': compressed,
+        'ratio': original / compressed if compressed else 0,
+        'seconds': elapsed,
+    }
+
+
+def evaluate(codec_name: str, source, param: str = None, candidates=None, workers: int = 1,
+             count: int = SAMPLE_COUNT, budget: int = SAMPLE_BUDGET) -> list:
+    """Коэффициент сжатия и время для каждого кандидата на выборке из source
+
+    Кандидаты оцениваются параллельно в workers процессах. Возвращает
+    список словарей с полем 'value' в порядке кандидатов.
+    """
+    default_param, default_candidates = TUNABLE[codec_name]
+    param = param or default_param
+    candidates = list(candidates or default_candidates)
+    size = source_size(source)
+
+    tasks = []
+    for value in candidates:
+        block_size = value if param == 'block_size' else SAMPLE_BLOCK_SIZE
+        blocks = read_ranges(source, sample_ranges(size, block_size, count, budget))
+        tasks.append((codec_name, {param: value, 'block_size': block_size}, blocks))
+
+    results = []
+    for value, result in zip(candidates, map_blocks(_evaluate_candidate, tasks, workers)):
+        result['value'] = value
+        results.append(result)
+    return results
+
+
+def choose(results: list, tolerance: float = TOLERANCE):
+    """Самый дешёвый кандидат, сжимающий не хуже лучшего с точностью до tolerance"""
+    best_ratio = max(result['ratio'] for result in results)
+    for result in results:
+        if result['ratio'] >= best_ratio * (1 - tolerance):
+            return result['value']
+
+
+def _load_cache(cache_path) -> dict:
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path) as fin:
+            return json.load(fin)
+    return {}
+
+
+def autotune(codec_name: str, source, param: str = None, candidates=None, workers: int = 1,
+             tolerance: float = TOLERANCE, count: int = SAMPLE_COUNT, budget: int = SAMPLE_BUDGET,
+             cache_path=None) -> dict:
+    """Подбирает параметр кодека по выборке и возвращает аргументы конструктора
+
+    source - байты или путь к файлу. Результат кэшируется по отпечатку
+    входа (в памяти и, если задан cache_path, в JSON-файле), так что
+    повторный вызов для тех же данных ничего не сжимает.
+    """
+    if codec_name not in TUNABLE:
+        raise ValueError(f"Неизвестный кодек: {codec_name}")
+    param = param or TUNABLE[codec_name][0]
+    candidates = list(candidates or TUNABLE[codec_name][1])
+    key = json.dumps([codec_name, param, candidates, tolerance, count, budget, fingerprint(source)])
+
+    if key not in _cache:
+        _cache.update(_load_cache(cache_path))
+    if key in _cache:
+        return dict(_cache[key])
+
+    results = evaluate(codec_name, source, param, candidates, workers, count, budget)
+    kwargs = {param: choose(results, tolerance)}
+    _cache[key] = kwargs
+
+    if cache_path:
+        stored = _load_cache(cache_path)
+        stored[key] = kwargs
+        with open(cache_path, 'w') as fout:
+            json.dump(stored, fout, indent=2)
+    return dict(kwargs)
+
+
+def tuned_codec(codec_name: str, source, workers: int = 1, **options):
+    """Кодек с подобранным параметром; workers используется и для подбора, и для сжатия"""
+    kwargs = autotune(codec_name, source, workers=workers, **options)
+    return CODECS[codec_name](workers=workers, **kwargs)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit(f"Использование: {sys.argv[0]} ФАЙЛ [КОДЕК ...]")
+    path = sys.argv[1]
+    names = sys.argv[2:] or ['lz77', 'bwt-mtf-rle-huffman']
+
+    for name in names:
+        start = time.perf_counter()
+        results = evaluate(name, path, workers=os.cpu_count())
+        param = TUNABLE[name][0]
+        print(f"\n{name}: {param}")
+        print("{:<10} {:<12} {:<14} {:<10} {:<8}".format('Value', 'Original (B)', 'Compressed (B)', 'Ratio', 'Time (s)'))
+        print("-" * 58)
+        for result in results:
+            print("{:<10} {:<12} {:<14} {:<10.2f} {:<8.2f}".format(
+                result['value'], result['original_size'], result['compressed_size'],
+                result['ratio'], result['seconds']))
+        print(f"Выбрано: {param}={choose(results)} за {time.perf_counter() - start:.1f} с")
@@ -0,0 +1,254 @@
+import argparse
+import bz2
+import io
+import json
+import lzma
+import multiprocessing
+import platform
+import random
+import struct
+import sys
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:  # Windows: пиковую память не меряем
+    resource = None
+
+from cli import CODECS, make_codec, parse_size
+from parallel import shared_pool
+
+CORPUS_KINDS = ('text', 'logs', 'random', 'binary')
+DEFAULT_SIZES = (64 * 1024, 256 * 1024)
+
+# Эталонные кодеки стандартной библиотеки: (сжатие, распаковка)
+BASELINES = {
+    'zlib': (lambda data: zlib.compress(data, 6), zlib.decompress),
+    'bz2': (lambda data: bz2.compress(data, 9), bz2.decompress),
+    'lzma': (lambda data: lzma.compress(data, preset=6), lzma.decompress),
+}
+
+WORDS = ('the', 'of', 'and', 'to', 'in', 'is', 'was', 'for', 'that', 'with', 'as', 'by',
+         'on', 'are', 'from', 'at', 'his', 'an', 'which', 'it', 'be', 'this', 'were', 'or',
+         'compression', 'block', 'data', 'transform', 'entropy', 'symbol', 'dictionary',
+         'window', 'match', 'frequency', 'encoder', 'decoder', 'stream', 'history', 'river',
+         'mountain', 'village', 'century', 'government', 'language', 'museum', 'station')
+
+
+def generate_text(size: int, rng: random.Random) -> bytes:
+    """Псевдотекст: слова с распределением, близким к закону Ципфа"""
+    weights = [1 / (rank + 1) for rank in range(len(WORDS))]
+    out = bytearray()
+    while len(out) < size:
+        sentence = rng.choices(WORDS, weights, k=rng.randint(5, 20))
+        out += (' '.join(sentence).capitalize() + '. ').encode()
+        if rng.random() < 0.1:
+            out += b'\n\n'
+    return bytes(out[:size])
+
+
+def generate_logs(size: int, rng: random.Random) -> bytes:
+    """Повторяющиеся строки журнала с меняющимися временем, адресом и кодом"""
+    levels = ('INFO', 'INFO', 'INFO', 'DEBUG', 'WARNING', 'ERROR')
+    paths = ('/api/v1/users', '/api/v1/orders', '/static/app.js', '/login', '/health')
+    out = bytearray()
+    timestamp = 1700000000.0
+    while len(out) < size:
+        timestamp += rng.expovariate(20)
+        stamp = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(timestamp))
+        line = (f"{stamp}.{int(timestamp * 1000) % 1000:03d} {rng.choice(levels):<7} "
+                f"10.0.{rng.randint(0, 3)}.{rng.randint(1, 254)} GET {rng.choice(paths)} "
+                f"{rng.choice((200, 200, 200, 304, 404, 500))} {rng.randint(80, 40000)}b "
+                f"{rng.random() * 250:.1f}ms\n")
+        out += line.encode()
+    return bytes(out[:size])
+
+
+def generate_random(size: int, rng: random.Random) -> bytes:
+    """Несжимаемые данные"""
+    return rng.randbytes(size)
+
+
+def generate_binary(size: int, rng: random.Random) -> bytes:
+    """Двоичные записи: целые, числа с плавающей точкой и выравнивание нулями"""
+    record = struct.Struct('<IHhdI12x')
+    out = bytearray()
+    key = 0
+    while len(out) < size:
+        key += rng.randint(1, 4)
+        out += record.pack(key, rng.randint(0, 15), rng.randint(-300, 300),
+                           round(rng.gauss(100, 15), 2), rng.getrandbits(8))
+    return bytes(out[:size])
+
+
+GENERATORS = {
+    'text': generate_text,
+    'logs': generate_logs,
+    'random': generate_random,
+    'binary': generate_binary,
+}
+
+
+def generate_corpus(kind: str, size: int, seed: int = 0) -> bytes:
+    """Детерминированный образец корпуса: одинаковый для одинаковых параметров"""
+    return GENERATORS[kind](size, random.Random(f"{kind}:{size}:{seed}"))
+
+
+def peak_rss_kb():
+    """Пиковый RSS процесса и его дочерних процессов в КБ (None без модуля resource)"""
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # На macOS ru_maxrss в байтах, на Linux - в килобайтах
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def _best_time(func, repeat: int):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None or elapsed < best else best
+    return result, best
+
+
+def run_case(codec_name: str, kind: str, size: int, seed: int, repeat: int,
+             block_size=None, workers=1) -> dict:
+    """Один замер; выполняется в отдельном процессе, чтобы пиковый RSS
+    относился только к этому кодеку
+
+    При workers > 1 все вызовы кодека идут через один пул процессов,
+    запущенный до замера: время и скорость сжатия и распаковки даны без
+    запуска пула, а его время записано отдельно в pool_startup_seconds.
+    """
+    if codec_name in BASELINES or workers is None or workers <= 1:
+        return _run_case(codec_name, kind, size, seed, repeat, block_size, workers, 0.0)
+
+    start = time.perf_counter()
+    with shared_pool(workers) as pool:
+        # Процессы пула создаются по мере поступления задач
+        list(pool.map(int, range(workers)))
+        pool_startup = time.perf_counter() - start
+        return _run_case(codec_name, kind, size, seed, repeat, block_size, workers, pool_startup)
+
+
+def _run_case(codec_name: str, kind: str, size: int, seed: int, repeat: int,
+              block_size, workers, pool_startup: float) -> dict:
+    data = generate_corpus(kind, size, seed)
+    baseline_rss = peak_rss_kb()
+
+    if codec_name in BASELINES:
+        compress, decompress = BASELINES[codec_name]
+    else:
+        codec = make_codec(codec_name, block_size, workers)
+
+        def compress(data):
+            out = io.BytesIO()
+            codec.write_container(io.BytesIO(data), out)
+            return out.getvalue()
+
+        def decompress(payload):
+            out = io.BytesIO()
+            codec.read_container(io.BytesIO(payload), out)
+            return out.getvalue()
+
+    compressed, compress_time = _best_time(lambda: compress(data), repeat)
+    restored, decompress_time = _best_time(lambda: decompress(compressed), repeat)
+    if restored != data:
+        raise ValueError(f"{codec_name}: распакованные данные не совпадают с исходными ({kind}, {size})")
+
+    megabytes = size / (1024 * 1024)
+    return {
+        'codec': codec_name,
+        'baseline': codec_name in BASELINES,
+        'corpus': kind,
+        'size': size,
+        'compressed_size': len(compressed),
+        'ratio': size / len(compressed) if compressed else 0,
+        'compress_mb_s': megabytes / compress_time if compress_time else None,
+        'decompress_mb_s': megabytes / decompress_time if decompress_time else None,
+        'compress_seconds': compress_time,
+        'decompress_seconds': decompress_time,
+        'pool_startup_seconds': pool_startup,
+        'baseline_rss_kb': baseline_rss,
+        'peak_rss_kb': peak_rss_kb(),
+    }
+
+
+def run_benchmark(codecs, kinds=CORPUS_KINDS, sizes=DEFAULT_SIZES, seed=0, repeat=1,
+                  block_size=None, workers=1, progress=None) -> dict:
+    """Прогон всех сочетаний кодек x корпус x размер; каждый замер в новом процессе"""
+    # spawn: дочерний процесс не наследует память родителя. Процессы
+    # ProcessPoolExecutor не демоны, поэтому при workers > 1 кодек может
+    # запустить в замере собственный пул
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for codec_name in codecs:
+        for kind in kinds:
+            for size in sizes:
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                    result = pool.submit(run_case, codec_name, kind, size, seed, repeat,
+                                         block_size, workers).result()
+                results.append(result)
+                if progress:
+                    progress(result)
+
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': seed,
+        'repeat': repeat,
+        'block_size': block_size,
+        'workers': workers,
+        'results': results,
+    }
+
+
+def format_row(result: dict) -> str:
+    rss = result['peak_rss_kb']
+    return "{:<20} {:<7} {:>9} {:>7.2f} {:>9.2f} {:>9.2f} {:>10}".format(
+        result['codec'], result['corpus'], result['size'], result['ratio'],
+        result['compress_mb_s'] or 0, result['decompress_mb_s'] or 0,
+        rss if rss is not None else '-')
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Сравнение скорости, коэффициента сжатия и памяти кодеков")
+    parser.add_argument('--codecs', nargs='+', choices=sorted(CODECS) + sorted(BASELINES),
+                        help="кодеки для замера (по умолчанию все)")
+    parser.add_argument('--corpus', nargs='+', choices=CORPUS_KINDS, default=list(CORPUS_KINDS),
+                        help="виды данных")
+    parser.add_argument('--sizes', nargs='+', type=parse_size, default=list(DEFAULT_SIZES),
+                        help="размеры образцов, например 64K 1M")
+    parser.add_argument('--repeat', type=int, default=1, help="число повторов, берётся лучшее время")
+    parser.add_argument('--seed', type=int, default=0, help="зерно генератора корпуса")
+    parser.add_argument('-b', '--block-size', type=parse_size, help="размер блока для кодеков проекта")
+    parser.add_argument('-w', '--workers', type=int, default=1, help="число процессов для кодеков проекта")
+    parser.add_argument('--no-baselines', action='store_true', help="не замерять zlib/bz2/lzma")
+    parser.add_argument('-o', '--output', help="файл для результатов в JSON (по умолчанию stdout)")
+    args = parser.parse_args(argv)
+
+    codecs = args.codecs or list(CODECS) + ([] if args.no_baselines else list(BASELINES))
+
+    print("{:<20} {:<7} {:>9} {:>7} {:>9} {:>9} {:>10}".format(
+        'Codec', 'Corpus', 'Size', 'Ratio', 'Comp MB/s', 'Dec MB/s', 'Peak KB'), file=sys.stderr)
+    print("-" * 77, file=sys.stderr)
+    report = run_benchmark(codecs, args.corpus, args.sizes, args.seed, args.repeat,
+                           args.block_size, args.workers,
+                           progress=lambda result: print(format_row(result), file=sys.stderr))
+
+    if args.output:
+        with open(args.output, 'w') as fout:
+            json.dump(report, fout, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+import argparse
+import sys
+import time
+
+from BWT_MTF_HA import BWT_MTF_HA_Compressor
+from BWT_MTF_RLE_HA import BWT_MTF_RLE_HA_Compressor
+from BWT_RLE import BWT_RLE_Compressor
+from HA import HuffmanCompressor
+from LZ77 import LZ77Compressor, LZSSCompressor
+from LZ77_HA import LZ77HuffmanCompressor
+from LZ78 import LZ78Compressor, LZWCompressor
+from LZ78_HA import LZ78HuffmanCompressor
+from RLE import RLECompressor
+from container import CODEC_IDS, CONTAINER_HEADER, CONTAINER_MAGIC
+from pipeline_stats import PipelineStats
+
+# Кодеки по имени из CODEC_IDS
+CODECS = {codec.codec_name: codec for codec in (
+    RLECompressor,
+    HuffmanCompressor,
+    LZ77Compressor,
+    LZSSCompressor,
+    LZ77HuffmanCompressor,
+    LZ78Compressor,
+    LZWCompressor,
+    LZ78HuffmanCompressor,
+    BWT_RLE_Compressor,
+    BWT_MTF_HA_Compressor,
+    BWT_MTF_RLE_HA_Compressor,
+)}
+CODEC_NAMES = {codec_id: name for name, codec_id in CODEC_IDS.items()}
+
+DEFAULT_CODEC = 'bwt-mtf-rle-huffman'
+
+SIZE_SUFFIXES = {'K': 1024, 'M': 1024 * 1024, 'G': 1024 * 1024 * 1024}
+
+
+def parse_size(text: str) -> int:
+    """Размер в байтах: число с необязательным суффиксом K, M или G"""
+    suffix = text[-1:].upper()
+    multiplier = SIZE_SUFFIXES.get(suffix, 1)
+    number = text[:-1] if suffix in SIZE_SUFFIXES else text
+    try:
+        size = int(number) * multiplier
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"некорректный размер: {text!r}")
+    if size <= 0:
+        raise argparse.ArgumentTypeError(f"размер должен быть положительным: {text!r}")
+    return size
+
+
+def make_codec(name: str, block_size=None, workers=1):
+    kwargs = {'workers': workers}
+    if block_size is not None:
+        kwargs['block_size'] = block_size
+    return CODECS[name](**kwargs)
+
+
+class CountingReader:
+    """Обёртка над входом: считает прочитанные байты и возвращает
+    сначала уже прочитанный префикс (заголовок контейнера)"""
+
+    def __init__(self, fin, prefix=b''):
+        self.fin = fin
+        self.prefix = prefix
+        self.count = len(prefix)
+
+    def read(self, size=-1) -> bytes:
+        data = b''
+        if self.prefix:
+            if size < 0:
+                data, self.prefix = self.prefix, b''
+            else:
+                data, self.prefix = self.prefix[:size], self.prefix[size:]
+                size -= len(data)
+            if not size:
+                return data
+        chunk = self.fin.read(size)
+        self.count += len(chunk)
+        return data + chunk
+
+
+class NullWriter:
+    """Приёмник для режима проверки: только считает байты"""
+
+    def __init__(self):
+        self.count = 0
+
+    def write(self, data) -> int:
+        self.count += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+def compress(args, fin, fout, stats=None) -> (int, int):
+    codec = make_codec(args.codec, args.block_size, args.workers)
+    return codec.write_container(fin, fout, stats)
+
+
+def decompress(args, fin, fout, stats=None) -> (int, int):
+    """Распаковка контейнера; кодек берётся из заголовка"""
+    header = fin.read(CONTAINER_HEADER.size)
+    if len(header) < CONTAINER_HEADER.size:
+        raise ValueError("Вход слишком короткий для контейнера")
+    magic, codec_id, block_size = CONTAINER_HEADER.unpack(header)
+    if magic != CONTAINER_MAGIC:
+        raise ValueError("Вход не является контейнером (неверная сигнатура)")
+    name = CODEC_NAMES.get(codec_id)
+    if name not in CODECS:
+        raise ValueError(f"Неизвестный кодек с ID {codec_id}")
+
+    codec = make_codec(name, block_size, args.workers)
+    reader = CountingReader(fin, header)
+    # При проверке индекс блоков сверяется с прочитанными блоками,
+    # при распаковке он не нужен
+    test = args.mode == 'test'
+    total = codec.read_container(reader, fout, stats, verify_index=test)
+    if not test:
+        reader.read()
+    return reader.count, total
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Сжатие и распаковка файлов кодеками проекта (формат блочного контейнера)")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('-c', '--compress', dest='mode', action='store_const', const='compress',
+                      help="сжать (по умолчанию)")
+    mode.add_argument('-d', '--decompress', dest='mode', action='store_const', const='decompress',
+                      help="распаковать")
+    mode.add_argument('-t', '--test', dest='mode', action='store_const', const='test',
+                      help="проверить целостность сжатого файла")
+    parser.add_argument('-C', '--codec', choices=sorted(CODECS), default=DEFAULT_CODEC,
+                        help=f"кодек для сжатия (по умолчанию {DEFAULT_CODEC})")
+    parser.add_argument('-o', '--output', help="выходной файл (по умолчанию stdout)")
+    parser.add_argument('-b', '--block-size', type=parse_size,
+                        help="размер блока, например 900K или 1M")
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help="число процессов для сжатия блоков")
+    parser.add_argument('-s', '--stats', action='store_true',
+                        help="вывести размеры, коэффициент, скорость и время по стадиям в stderr")
+    parser.add_argument('input', nargs='?', default='-', help="входной файл (по умолчанию stdin)")
+    args = parser.parse_args(argv)
+    args.mode = args.mode or 'compress'
+    if args.workers < 1:
+        parser.error("--workers должно быть не меньше 1")
+
+    stats = PipelineStats() if args.stats else None
+    fin = sys.stdin.buffer
+    fout = NullWriter() if args.mode == 'test' else sys.stdout.buffer
+    start = time.perf_counter()
+    try:
+        if args.input != '-':
+            fin = open(args.input, 'rb')
+        if args.mode != 'test' and args.output not in (None, '-'):
+            fout = open(args.output, 'wb')
+        if args.mode == 'compress':
+            input_size, output_size = compress(args, fin, fout, stats)
+        else:
+            input_size, output_size = decompress(args, fin, fout, stats)
+        fout.flush()
+    except (ValueError, OSError) as e:
+        print(f"{parser.prog}: ошибка: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if fin is not sys.stdin.buffer:
+            fin.close()
+        if fout is not sys.stdout.buffer and not isinstance(fout, NullWriter):
+            fout.close()
+    elapsed = time.perf_counter() - start
+
+    if args.stats:
+        original_size = input_size if args.mode == 'compress' else output_size
+        compressed_size = output_size if args.mode == 'compress' else input_size
+        ratio = original_size / compressed_size if compressed_size else 0
+        speed = original_size / elapsed / (1024 * 1024) if elapsed else 0
+        print(f"Режим: {args.mode}", file=sys.stderr)
+        print(f"Исходный размер: {original_size} байт", file=sys.stderr)
+        print(f"Сжатый размер: {compressed_size} байт", file=sys.stderr)
+        print(f"Коэффициент сжатия: {ratio:.2f}", file=sys.stderr)
+        print(f"Время: {elapsed:.2f} с ({speed:.2f} МБ/с)", file=sys.stderr)
+        print(stats.report(), file=sys.stderr)
+    elif args.mode == 'test':
+        print(f"{args.input}: OK", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,462 @@
+import io
+import os
+import struct
+import time
+from bisect import bisect_right
+from functools import partial
+from itertools import accumulate
+
+from parallel import map_blocks, read_blocks
+from pipeline_stats import PipelineStats
+
+# Необязательный индекс блоков в конце сжатого файла:
+# записи (смещение блока, сжатая длина, исходная длина),
+# затем (смещение индекса, число блоков, сигнатура)
+INDEX_ENTRY = struct.Struct('>QII')
+INDEX_FOOTER = struct.Struct('>QI4s')
+INDEX_MAGIC = b'BIDX'
+
+
+def write_block_index(fout, entries):
+    """Дописывает индекс блоков в конец файла"""
+    index_offset = fout.tell()
+    for entry in entries:
+        fout.write(INDEX_ENTRY.pack(*entry))
+    fout.write(INDEX_FOOTER.pack(index_offset, len(entries), INDEX_MAGIC))
+
+
+def read_block_index(fin):
+    """Читает индекс блоков; None, если файл записан без индекса"""
+    fin.seek(0, os.SEEK_END)
+    file_size = fin.tell()
+    entries = None
+
+    if file_size >= INDEX_FOOTER.size:
+        fin.seek(file_size - INDEX_FOOTER.size)
+        index_offset, count, magic = INDEX_FOOTER.unpack(fin.read(INDEX_FOOTER.size))
+        index_size = count * INDEX_ENTRY.size
+        if magic == INDEX_MAGIC and index_offset + index_size + INDEX_FOOTER.size == file_size:
+            fin.seek(index_offset)
+            entries = list(INDEX_ENTRY.iter_unpack(fin.read(index_size)))
+
+    fin.seek(0)
+    return entries
+
+
+def read_indexed_blocks(fin, entries):
+    """Читает сжатые блоки по смещениям из индекса"""
+    for offset, compressed_size, _ in entries:
+        fin.seek(offset)
+        yield fin.read(compressed_size)
+
+
+# Единый контейнер для всех кодеков:
+# заголовок (сигнатура, ID кодека, размер блока), затем блоки
+# (исходная длина, сжатая длина, данные), завершающая пара (0, 0)
+# и индекс блоков в формате write_block_index() со смещениями данных блоков
+CONTAINER_MAGIC = b'PYCZ'
+CONTAINER_HEADER = struct.Struct('>4sBI')
+CONTAINER_BLOCK = struct.Struct('>II')
+
+# Идентификаторы кодеков в заголовке контейнера
+CODEC_IDS = {
+    'huffman': 1,
+    'lz77': 2,
+    'lz77-huffman': 3,
+    'lz78': 4,
+    'lzw': 5,
+    'lz78-huffman': 6,
+    'bwt-rle': 7,
+    'bwt-mtf-huffman': 8,
+    'bwt-mtf-rle-huffman': 9,
+    'rle': 10,
+    'lzss': 11,
+}
+
+# Размер блока контейнера для кодеков без собственного block_size
+DEFAULT_CONTAINER_BLOCK_SIZE = 1024 * 1024
+
+
+def read_container_header(fin) -> (int, int):
+    """Читает заголовок контейнера: (ID кодека, размер блока)"""
+    header = fin.read(CONTAINER_HEADER.size)
+    if len(header) != CONTAINER_HEADER.size:
+        raise ValueError("Обрезанный заголовок контейнера")
+    magic, codec_id, block_size = CONTAINER_HEADER.unpack(header)
+    if magic != CONTAINER_MAGIC:
+        raise ValueError("Данные не являются контейнером (неверная сигнатура)")
+    return codec_id, block_size
+
+
+def read_container_blocks(fin, entries: list = None):
+    """Последовательно читает блоки контейнера: (исходная длина, данные)
+
+    fin стоит сразу после заголовка контейнера. Если передан список
+    entries, в него дописываются записи индекса прочитанных блоков.
+    """
+    position = CONTAINER_HEADER.size
+    while True:
+        header = fin.read(CONTAINER_BLOCK.size)
+        if len(header) != CONTAINER_BLOCK.size:
+            raise ValueError("Контейнер обрывается до завершающего блока")
+        position += CONTAINER_BLOCK.size
+        original_size, compressed_size = CONTAINER_BLOCK.unpack(header)
+        if not original_size and not compressed_size:
+            return
+        payload = fin.read(compressed_size)
+        if len(payload) != compressed_size:
+            raise ValueError("Контейнер обрывается посреди блока")
+        if entries is not None:
+            entries.append((position, compressed_size, original_size))
+        position += compressed_size
+        yield original_size, payload
+
+
+def verify_block_index(fin, entries: list):
+    """Дочитывает индекс после завершающего блока и сверяет его с entries
+
+    entries - записи блоков, собранные read_container_blocks().
+    После индекса вход должен закончиться.
+    """
+    if entries:
+        offset, compressed_size, _ = entries[-1]
+        index_offset = offset + compressed_size + CONTAINER_BLOCK.size
+    else:
+        index_offset = CONTAINER_HEADER.size + CONTAINER_BLOCK.size
+    index_size = len(entries) * INDEX_ENTRY.size
+    index = fin.read(index_size + INDEX_FOOTER.size)
+    if len(index) != index_size + INDEX_FOOTER.size:
+        raise ValueError("Контейнер обрывается посреди индекса блоков")
+
+    footer_offset, count, magic = INDEX_FOOTER.unpack_from(index, index_size)
+    if magic != INDEX_MAGIC:
+        raise ValueError("Повреждённый индекс блоков контейнера: неверная сигнатура")
+    if count != len(entries):
+        raise ValueError(f"Повреждённый индекс блоков контейнера: {count} записей, прочитано блоков {len(entries)}")
+    if footer_offset != index_offset:
+        raise ValueError(f"Повреждённый индекс блоков контейнера: смещение индекса {footer_offset}, "
+                         f"ожидалось {index_offset}")
+    for number, (entry, expected) in enumerate(zip(INDEX_ENTRY.iter_unpack(index[:index_size]), entries)):
+        if entry != expected:
+            raise ValueError(f"Повреждённый индекс блоков контейнера: запись блока {number} {entry}, "
+                             f"ожидалась {expected}")
+    if fin.read(1):
+        raise ValueError("Лишние данные после индекса блоков контейнера")
+
+
+class ContainerMixin:
+    """Запись и чтение единого контейнера поверх compress_block/decompress_block
+
+    Класс кодека задаёт codec_name и методы compress_block(bytes) -> bytes
+    и decompress_block(bytes) -> bytes; блоки сжимаются независимо,
+    поэтому при workers > 1 обрабатываются в пуле процессов.
+    Кодек с stage_stats = True принимает в этих методах аргумент stats
+    и замеряет свои стадии; у остальных замеряются только блоки целиком.
+    """
+
+    codec_name = None
+    block_size = DEFAULT_CONTAINER_BLOCK_SIZE
+    workers = 1
+    stage_stats = False
+
+    @property
+    def codec_id(self) -> int:
+        return CODEC_IDS[self.codec_name]
+
+    def write_container(self, fin, fout, stats: PipelineStats = None) -> (int, int):
+        """Сжимает поток fin в контейнер fout; (исходный размер, размер контейнера)
+
+        Смещения считаются по записанным байтам, так что fout может быть
+        и несматываемым потоком (канал, stdout). Если передан stats,
+        в него записывается статистика по блокам и стадиям.
+        """
+        start = time.perf_counter()
+        header = CONTAINER_HEADER.pack(CONTAINER_MAGIC, self.codec_id, self.block_size)
+        fout.write(header)
+        position = len(header)
+        original_size = 0
+        entries = []
+
+        blocks = read_blocks(fin, self.block_size)
+        for block_len, payload in self._map_with_stats(self._compress_sized, blocks, stats):
+            fout.write(CONTAINER_BLOCK.pack(block_len, len(payload)))
+            position += CONTAINER_BLOCK.size
+            entries.append((position, len(payload), block_len))
+            fout.write(payload)
+            position += len(payload)
+            original_size += block_len
+
+        fout.write(CONTAINER_BLOCK.pack(0, 0))
+        position += CONTAINER_BLOCK.size
+        for entry in entries:
+            fout.write(INDEX_ENTRY.pack(*entry))
+        fout.write(INDEX_FOOTER.pack(position, len(entries), INDEX_MAGIC))
+        position += len(entries) * INDEX_ENTRY.size + INDEX_FOOTER.size
+
+        if stats is not None:
+            stats.elapsed += time.perf_counter() - start
+        return original_size, position
+
+    def read_container(self, fin, fout, stats: PipelineStats = None, verify_index=False) -> int:
+        """Распаковывает контейнер fin в fout; возвращает размер распакованных данных
+
+        С verify_index индекс после завершающего блока дочитывается
+        и сверяется с прочитанными блоками (verify_block_index()).
+        """
+        start = time.perf_counter()
+        codec_id, _ = read_container_header(fin)
+        if codec_id != self.codec_id:
+            raise ValueError(f"Контейнер записан другим кодеком (ID {codec_id}, ожидался {self.codec_id})")
+
+        entries = [] if verify_index else None
+        total = 0
+        for block in self._map_with_stats(self._decompress_checked, read_container_blocks(fin, entries), stats):
+            fout.write(block)
+            total += len(block)
+        if verify_index:
+            verify_block_index(fin, entries)
+
+        if stats is not None:
+            stats.elapsed += time.perf_counter() - start
+        return total
+
+    def compress_with_stats(self, data: bytes, hooks=()) -> (bytes, PipelineStats):
+        """Сжимает data в контейнер; возвращает (контейнер, статистика)"""
+        stats = PipelineStats(hooks)
+        fout = io.BytesIO()
+        self.write_container(io.BytesIO(data), fout, stats)
+        return fout.getvalue(), stats
+
+    def decompress_with_stats(self, data: bytes, hooks=()) -> (bytes, PipelineStats):
+        """Распаковывает контейнер data; возвращает (данные, статистика)"""
+        stats = PipelineStats(hooks)
+        fout = io.BytesIO()
+        self.read_container(io.BytesIO(data), fout, stats)
+        return fout.getvalue(), stats
+
+    def read_range(self, source, offset: int, length: int) -> bytes:
+        """Байты offset..offset+length-1 исходных данных без распаковки всего файла
+
+        source - путь или сматываемый файл с индексом блоков: контейнер
+        либо файл, записанный с block_index=True. Распаковываются только
+        блоки, покрывающие диапазон.
+        """
+        if offset < 0 or length < 0:
+            raise ValueError(f"Некорректный диапазон: offset={offset}, length={length}")
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, 'rb') as fin:
+                return self.read_range(fin, offset, length)
+
+        if source.read(len(CONTAINER_MAGIC)) == CONTAINER_MAGIC:
+            source.seek(0)
+            codec_id, _ = read_container_header(source)
+            if codec_id != self.codec_id:
+                raise ValueError(f"Контейнер записан другим кодеком (ID {codec_id}, ожидался {self.codec_id})")
+        entries = read_block_index(source)
+        if entries is None:
+            raise ValueError("Для чтения диапазона нужен индекс блоков")
+
+        # Начало каждого блока в исходных данных
+        starts = [0, *accumulate(entry[2] for entry in entries)]
+        end = min(offset + length, starts[-1])
+        if offset >= end:
+            return b''
+        first = bisect_right(starts, offset) - 1
+        last = bisect_right(starts, end - 1) - 1
+
+        covered = entries[first:last + 1]
+        payloads = zip((entry[2] for entry in covered), read_indexed_blocks(source, covered))
+        data = b''.join(map_blocks(self._decompress_checked, payloads, self.workers))
+        return data[offset - starts[first]:end - starts[first]]
+
+    def compressobj(self):
+        """Инкрементальный компрессор в контейнер (в духе zlib.compressobj)"""
+        return ContainerCompressor(self)
+
+    def decompressobj(self):
+        """Инкрементальный декомпрессор контейнера (в духе zlib.decompressobj)"""
+        return ContainerDecompressor(self)
+
+    def write_records(self, fin, fout, stats: PipelineStats = None) -> list:
+        """Сжимает fin блоками и пишет записи блоков подряд в fout
+
+        Возвращает записи индекса для write_block_index(): (смещение,
+        сжатый размер, длина блока), где длина - фактически прочитанная.
+        """
+        entries = []
+        blocks = read_blocks(fin, self.block_size)
+        for block_len, record in self._map_with_stats(self._compress_sized, blocks, stats):
+            entries.append((fout.tell(), len(record), block_len))
+            fout.write(record)
+        return entries
+
+    def _map_with_stats(self, func, items, stats):
+        """map_blocks по func(item, stats)
+
+        В пуле процессов каждый блок замеряется в собственном объекте
+        статистики, который затем добавляется к stats.
+        """
+        if stats is None:
+            yield from map_blocks(func, items, self.workers)
+        elif self.workers is None or self.workers <= 1:
+            for item in items:
+                yield func(item, stats)
+        else:
+            for result, block_stats in map_blocks(partial(_call_with_stats, func), items, self.workers):
+                stats.merge(block_stats)
+                yield result
+
+    def _compress_sized(self, block, stats=None):
+        if stats is None:
+            return len(block), self.compress_block(block)
+        with stats.block(len(block)) as record:
+            payload = self.compress_block(block, stats=stats) if self.stage_stats else self.compress_block(block)
+            record.bytes_out = len(payload)
+        return len(block), payload
+
+    def _decompress_measured(self, payload, stats=None):
+        if stats is None:
+            return self.decompress_block(payload)
+        with stats.block(len(payload)) as record:
+            block = self.decompress_block(payload, stats=stats) if self.stage_stats else self.decompress_block(payload)
+            record.bytes_out = len(block)
+        return block
+
+    def _decompress_checked(self, sized_payload, stats=None):
+        original_size, payload = sized_payload
+        block = self._decompress_measured(payload, stats)
+        if len(block) != original_size:
+            raise ValueError(f"Размер распакованного блока {len(block)} не совпадает с заголовком {original_size}")
+        return block
+
+
+def _call_with_stats(func, item):
+    """func(item, stats) в процессе пула: результат и статистика блока"""
+    stats = PipelineStats()
+    return func(item, stats), stats
+
+
+class ContainerCompressor:
+    """Инкрементальное сжатие: compress(chunk) отдаёт готовые байты контейнера,
+    flush() дописывает последний блок и индекс
+
+    В памяти держится не больше одного неполного блока входа.
+    """
+
+    def __init__(self, codec):
+        self.codec = codec
+        self.buffer = bytearray()
+        self.position = 0
+        self.entries = []
+        self.finished = False
+
+    def compress(self, data) -> bytes:
+        if self.finished:
+            raise ValueError("compress() после flush()")
+        output = bytearray()
+        if not self.position:
+            output += CONTAINER_HEADER.pack(CONTAINER_MAGIC, self.codec.codec_id, self.codec.block_size)
+            self.position = len(output)
+
+        self.buffer += data
+        block_size = self.codec.block_size
+        start = 0
+        while len(self.buffer) - start >= block_size:
+            self._write_block(output, bytes(self.buffer[start:start + block_size]))
+            start += block_size
+        del self.buffer[:start]
+        return bytes(output)
+
+    def flush(self) -> bytes:
+        """Завершает контейнер; после flush() объект больше не принимает данные"""
+        output = bytearray(self.compress(b''))
+        if self.buffer:
+            self._write_block(output, bytes(self.buffer))
+            self.buffer.clear()
+
+        output += CONTAINER_BLOCK.pack(0, 0)
+        self.position += CONTAINER_BLOCK.size
+        for entry in self.entries:
+            output += INDEX_ENTRY.pack(*entry)
+        output += INDEX_FOOTER.pack(self.position, len(self.entries), INDEX_MAGIC)
+        self.finished = True
+        return bytes(output)
+
+    def _write_block(self, output, block):
+        payload = self.codec.compress_block(block)
+        output += CONTAINER_BLOCK.pack(len(block), len(payload))
+        self.position += CONTAINER_BLOCK.size
+        self.entries.append((self.position, len(payload), len(block)))
+        output += payload
+        self.position += len(payload)
+
+
+class ContainerDecompressor:
+    """Инкрементальная распаковка контейнера порциями произвольного размера
+
+    Во входном буфере держится не больше одного сжатого блока.
+    После индекса eof становится True, а лишние байты попадают в unused_data.
+    """
+
+    def __init__(self, codec):
+        self.codec = codec
+        self.buffer = bytearray()
+        self.header_read = False
+        self.block_count = 0
+        self.trailer_size = None  # Размер индекса после завершающего блока
+        self.eof = False
+        self.unused_data = b''
+
+    def decompress(self, data) -> bytes:
+        if self.eof:
+            self.unused_data += data
+            return b''
+        self.buffer += data
+        output = bytearray()
+        buffer = self.buffer
+        pos = 0
+
+        if not self.header_read:
+            if len(buffer) < CONTAINER_HEADER.size:
+                return b''
+            magic, codec_id, _ = CONTAINER_HEADER.unpack_from(buffer)
+            if magic != CONTAINER_MAGIC:
+                raise ValueError("Данные не являются контейнером (неверная сигнатура)")
+            if codec_id != self.codec.codec_id:
+                raise ValueError(f"Контейнер записан другим кодеком (ID {codec_id}, ожидался {self.codec.codec_id})")
+            self.header_read = True
+            pos = CONTAINER_HEADER.size
+
+        while self.trailer_size is None and len(buffer) - pos >= CONTAINER_BLOCK.size:
+            original_size, compressed_size = CONTAINER_BLOCK.unpack_from(buffer, pos)
+            if not original_size and not compressed_size:
+                pos += CONTAINER_BLOCK.size
+                self.trailer_size = self.block_count * INDEX_ENTRY.size + INDEX_FOOTER.size
+                break
+            end = pos + CONTAINER_BLOCK.size + compressed_size
+            if len(buffer) < end:
+                break
+            block = self.codec.decompress_block(bytes(buffer[pos + CONTAINER_BLOCK.size:end]))
+            if len(block) != original_size:
+                raise ValueError(f"Размер распакованного блока {len(block)} не совпадает с заголовком {original_size}")
+            output += block
+            self.block_count += 1
+            pos = end
+
+        if self.trailer_size is not None and len(buffer) - pos >= self.trailer_size:
+            footer_end = pos + self.trailer_size
+            _, count, magic = INDEX_FOOTER.unpack_from(buffer, footer_end - INDEX_FOOTER.size)
+            if magic != INDEX_MAGIC or count != self.block_count:
+                raise ValueError("Повреждённый индекс блоков контейнера")
+            self.unused_data = bytes(buffer[footer_end:])
+            self.eof = True
+            pos = len(buffer)
+
+        del buffer[:pos]
+        return bytes(output)
+
+    def flush(self) -> bytes:
+        """Проверяет, что контейнер дочитан до конца"""
+        if not self.eof:
+            raise ValueError("Контейнер оборван: нет завершающего блока или индекса")
+        return b''
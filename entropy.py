@@ -0,0 +1,159 @@
+import hashlib
+import math
+from collections import Counter, OrderedDict
+from itertools import chain
+
+try:
+    import numpy as np
+except ImportError:  # без NumPy считаем на Counter
+    np = None
+
+from parallel import map_blocks
+
+# Объём блоков в одной задаче пула: мелкие блоки по одному не окупают
+# передачу между процессами
+BATCH_BYTES = 1024 * 1024
+
+
+def histogram(data: bytes) -> list:
+    """Частоты всех 256 значений байта"""
+    if np is not None:
+        return np.bincount(np.frombuffer(data, dtype=np.uint8), minlength=256).tolist()
+    counts = [0] * 256
+    for byte, count in Counter(data).items():
+        counts[byte] = count
+    return counts
+
+
+def entropy_from_counts(counts) -> float:
+    """Энтропия Шеннона (бит на символ) распределения, заданного частотами"""
+    if np is not None:
+        counts = np.asarray(counts, dtype=np.float64)
+        counts = counts[counts > 0]
+        total = counts.sum()
+        if not total:
+            return 0.0
+        return float(math.log2(total) - (counts * np.log2(counts)).sum() / total)
+
+    total = sum(counts)
+    if not total:
+        return 0.0
+    return math.log2(total) - sum(count * math.log2(count) for count in counts if count) / total
+
+
+def shannon_entropy(data: bytes) -> float:
+    """Энтропия нулевого порядка, бит на байт"""
+    return entropy_from_counts(histogram(data)) if data else 0.0
+
+
+def _gram_counts(data: bytes, length: int):
+    """Частоты всех подстрок длины length (с перекрытием)"""
+    count = len(data) - length + 1
+    if count <= 0:
+        return []
+    if np is not None and length <= 8:
+        values = np.frombuffer(data, dtype=np.uint8).astype(np.uint64)
+        keys = np.zeros(count, dtype=np.uint64)
+        for j in range(length):
+            keys = (keys << np.uint64(8)) | values[j:j + count]
+        if length <= 2:
+            return np.bincount(keys.astype(np.int64), minlength=1 << (8 * length))
+        return np.unique(keys, return_counts=True)[1]
+    return list(Counter(data[i:i + length] for i in range(count)).values())
+
+
+def order_k_entropy(data: bytes, k: int) -> float:
+    """Условная энтропия порядка k: H(X_i | k предыдущих байт), бит на байт
+
+    Считается как разность энтропий (k+1)-грамм и их k-байтовых
+    контекстов по одним и тем же позициям.
+    """
+    if k < 0:
+        raise ValueError(f"Порядок должен быть неотрицательным: {k}")
+    if not k:
+        return shannon_entropy(data)
+    if len(data) <= k:
+        return 0.0
+    # Контексты берутся только там, где за ними есть следующий байт
+    joint = entropy_from_counts(_gram_counts(data, k + 1))
+    context = entropy_from_counts(_gram_counts(data[:-1], k))
+    return joint - context
+
+
+def _apply_batch(task) -> list:
+    """func для каждого блока пачки (задача пула в BlockMemo.map)"""
+    func, blocks = task
+    return [func(block) for block in blocks]
+
+
+def _batches(blocks, batch_bytes: int) -> list:
+    """Разбивает блоки по порядку на пачки примерно по batch_bytes байт"""
+    result, batch, size = [], [], 0
+    for block in blocks:
+        batch.append(block)
+        size += len(block)
+        if size >= batch_bytes:
+            result.append(batch)
+            batch, size = [], 0
+    if batch:
+        result.append(batch)
+    return result
+
+
+class BlockMemo:
+    """Мемоизация func(block) по содержимому блока
+
+    Ключ - размер и хэш блока, поэтому блок с тем же содержимым (повтор
+    внутри данных или повторный анализ тех же данных с тем же размером
+    блока) обрабатывается один раз. Хранится не больше max_entries
+    последних результатов. func должна быть функцией уровня модуля,
+    чтобы промахи можно было считать в пуле процессов.
+    """
+
+    def __init__(self, func, max_entries: int = 100000):
+        self.func = func
+        self.max_entries = max_entries
+        self.results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(block: bytes):
+        return len(block), hashlib.blake2b(block, digest_size=16).digest()
+
+    def map(self, blocks, workers: int = 1) -> list:
+        """Результаты func для блоков по порядку; промахи считаются в workers процессах"""
+        keys = [self.key(block) for block in blocks]
+        missing = {}
+        for key, block in zip(keys, blocks):
+            if key in self.results:
+                self.results.move_to_end(key)
+            elif key not in missing:
+                missing[key] = block
+
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+        computed = dict(zip(missing, self._compute(list(missing.values()), workers)))
+
+        output = [computed[key] if key in computed else self.results[key] for key in keys]
+        for key, result in computed.items():
+            self.results[key] = result
+            if len(self.results) > self.max_entries:
+                self.results.popitem(last=False)
+        return output
+
+    def _compute(self, blocks: list, workers: int):
+        if workers is None or workers <= 1 or len(blocks) <= 1:
+            return map(self.func, blocks)
+        # Пачки около BATCH_BYTES, но не меньше одной на процесс
+        total = sum(map(len, blocks))
+        batch_bytes = max(1, min(BATCH_BYTES, -(-total // workers)))
+        tasks = [(self.func, batch) for batch in _batches(blocks, batch_bytes)]
+        return chain.from_iterable(map_blocks(_apply_batch, tasks, workers))
+
+    def __call__(self, block: bytes):
+        return self.map([block])[0]
+
+    def clear(self):
+        self.results.clear()
+        self.hits = self.misses = 0
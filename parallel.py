@@ -0,0 +1,67 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+# Общие пулы shared_pool(): число процессов -> (PID владельца, пул)
+_shared_pools = {}
+
+
+@contextmanager
+def shared_pool(workers: int):
+    """Внутри блока with map_blocks с тем же workers использует один пул
+
+    Без него каждый вызов map_blocks запускает и останавливает свой пул.
+    Пул принадлежит процессу, создавшему его: в дочерних процессах
+    map_blocks по-прежнему создаёт собственные пулы.
+    """
+    pool = ProcessPoolExecutor(max_workers=workers)
+    previous = _shared_pools.get(workers)
+    _shared_pools[workers] = (os.getpid(), pool)
+    try:
+        yield pool
+    finally:
+        if previous is None:
+            del _shared_pools[workers]
+        else:
+            _shared_pools[workers] = previous
+        pool.shutdown()
+
+
+def map_blocks(func, blocks, workers: int = 1):
+    """Применяет func к каждому блоку и отдаёт результаты в исходном порядке
+
+    При workers > 1 блоки обрабатываются в пуле процессов. Одновременно
+    в работе не больше 2 * workers блоков, поэтому входной поток читается
+    по мере готовности результатов, а не целиком.
+    """
+    if workers is None or workers <= 1:
+        for block in blocks:
+            yield func(block)
+        return
+
+    owner, pool = _shared_pools.get(workers, (None, None))
+    if owner == os.getpid():
+        yield from _map_in_pool(pool, func, blocks, workers)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from _map_in_pool(pool, func, blocks, workers)
+
+
+def _map_in_pool(pool, func, blocks, workers: int):
+    pending = deque()
+    for block in blocks:
+        pending.append(pool.submit(func, block))
+        if len(pending) >= 2 * workers:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def read_blocks(fin, block_size: int):
+    """Читает файл блоками по block_size байт"""
+    while True:
+        block = fin.read(block_size)
+        if not block:
+            break
+        yield block
@@ -0,0 +1,168 @@
+import cProfile
+import pstats
+import time
+from contextlib import contextmanager
+
+
+class StageTimer:
+    """Накопленные показатели одной стадии: вызовы, время и объём данных"""
+
+    __slots__ = ('calls', 'wall', 'cpu', 'bytes_in', 'bytes_out')
+
+    def __init__(self):
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def merge(self, other: 'StageTimer'):
+        self.calls += other.calls
+        self.wall += other.wall
+        self.cpu += other.cpu
+        self.bytes_in += other.bytes_in
+        self.bytes_out += other.bytes_out
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __getstate__(self):
+        return self.as_dict()
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+
+class StageRecord:
+    """Замер одной стадии: bytes_out заполняется внутри блока with"""
+
+    __slots__ = ('bytes_in', 'bytes_out')
+
+    def __init__(self, bytes_in: int = 0):
+        self.bytes_in = bytes_in
+        self.bytes_out = 0
+
+
+class PipelineStats:
+    """Статистика конвейера по стадиям (BWT, MTF, RLE, Huffman, LZ77, ...)
+
+    Для каждой стадии копятся время (настенное и процессорное), объём
+    данных на входе и выходе и число вызовов; total - то же для блоков
+    целиком, blocks - число блоков, elapsed - полное время операции.
+    hooks - вызываемые объекты hook(event, stage) с event 'start'/'stop',
+    например ProfilerHook или метка для внешнего сэмплирующего профилировщика.
+    Хуки вызываются только в том процессе, где создан объект: при
+    workers > 1 блоки замеряются в пуле без хуков.
+    """
+
+    def __init__(self, hooks=()):
+        self.stages = {}
+        self.total = StageTimer()
+        self.blocks = 0
+        self.elapsed = 0.0
+        self.hooks = list(hooks)
+
+    @contextmanager
+    def stage(self, name: str, bytes_in: int = 0):
+        """Замер стадии name; стадии хранятся в порядке первого вызова"""
+        timer = self.stages.get(name)
+        if timer is None:
+            timer = self.stages[name] = StageTimer()
+        with self._timed(timer, name, bytes_in) as record:
+            yield record
+
+    @contextmanager
+    def block(self, bytes_in: int = 0):
+        """Замер обработки одного блока целиком"""
+        with self._timed(self.total, 'block', bytes_in) as record:
+            yield record
+        self.blocks += 1
+
+    @contextmanager
+    def _timed(self, timer: StageTimer, name: str, bytes_in: int):
+        record = StageRecord(bytes_in)
+        for hook in self.hooks:
+            hook('start', name)
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield record
+        finally:
+            timer.cpu += time.process_time() - cpu
+            timer.wall += time.perf_counter() - wall
+            timer.calls += 1
+            timer.bytes_in += record.bytes_in
+            timer.bytes_out += record.bytes_out
+            for hook in self.hooks:
+                hook('stop', name)
+
+    def merge(self, other: 'PipelineStats'):
+        """Добавляет статистику другого объекта (например, из процесса пула)"""
+        for name, timer in other.stages.items():
+            self.stages.setdefault(name, StageTimer()).merge(timer)
+        self.total.merge(other.total)
+        self.blocks += other.blocks
+
+    def as_dict(self) -> dict:
+        return {
+            'blocks': self.blocks,
+            'elapsed': self.elapsed,
+            'total': self.total.as_dict(),
+            'stages': {name: timer.as_dict() for name, timer in self.stages.items()},
+        }
+
+    def report(self) -> str:
+        """Таблица по стадиям: время, доля от времени блоков, объём и скорость"""
+        # Без замера блоков (потоковое сжатие) доля считается от полного времени
+        base = self.total.wall or self.elapsed
+        lines = ["{:<10} {:>6} {:>9} {:>9} {:>7} {:>12} {:>12} {:>9}".format(
+            'Stage', 'Calls', 'Wall (s)', 'CPU (s)', 'Share', 'In (B)', 'Out (B)', 'MB/s')]
+        lines.append("-" * 80)
+        for name, timer in [*self.stages.items(), ('total', self.total)]:
+            share = timer.wall / base * 100 if base else 0
+            speed = timer.bytes_in / timer.wall / (1024 * 1024) if timer.wall else 0
+            lines.append("{:<10} {:>6} {:>9.3f} {:>9.3f} {:>6.1f}% {:>12} {:>12} {:>9.2f}".format(
+                name, timer.calls, timer.wall, timer.cpu, share, timer.bytes_in, timer.bytes_out, speed))
+        lines.append(f"Блоков: {self.blocks}, полное время: {self.elapsed:.3f} с")
+        return '\n'.join(lines)
+
+    def __getstate__(self):
+        # Хуки (профилировщики, замыкания) между процессами не передаются
+        state = self.__dict__.copy()
+        state['hooks'] = []
+        return state
+
+
+@contextmanager
+def measure(stats, name: str, bytes_in: int = 0):
+    """stats.stage(name) или пустой замер, если статистика не собирается"""
+    if stats is None:
+        yield StageRecord(bytes_in)
+    else:
+        with stats.stage(name, bytes_in) as record:
+            yield record
+
+
+class ProfilerHook:
+    """Хук PipelineStats: cProfile включается только внутри выбранных стадий"""
+
+    def __init__(self, stages=None):
+        self.stages = set(stages) if stages else None
+        self.profile = cProfile.Profile()
+        self.depth = 0  # Стадии вложены в блок: профиль включён, пока открыта хоть одна
+
+    def __call__(self, event: str, stage: str):
+        if self.stages is not None and stage not in self.stages:
+            return
+        if event == 'start':
+            self.depth += 1
+            if self.depth == 1:
+                self.profile.enable()
+        else:
+            self.depth -= 1
+            if not self.depth:
+                self.profile.disable()
+
+    def print_stats(self, sort='cumulative', limit=20):
+        pstats.Stats(self.profile).sort_stats(sort).print_stats(limit)